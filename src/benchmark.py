@@ -0,0 +1,420 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import re
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from checko_stub import CheckoStubServer
+from data_fetcher import DataFetcher
+from data_processor import DataProcessor
+from enricher import Enricher
+from instrumentation import Metrics
+from name_dedup import NameDedupIndex, dedup_seed_by_name
+from rate_limiter import AdaptiveRateLimiter
+from rating_scraper import HTML_PARSER, RatingScraper
+from records import RecordColumns
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def make_synthetic_frame(rows: int, revenue_format: str = 'text', seed: int = 42) -> pd.DataFrame:
+    """Генерирует синтетический «сырой» DataFrame в формате обогащённых записей.
+
+    revenue_format='numeric' — выручка числом, как её возвращает DataFetcher;
+    'text' — строками вида «1 234,5 млрд», как в импортированных выгрузках.
+    """
+    rng = np.random.default_rng(seed)
+    amounts = rng.uniform(1, 5000, rows).round(1)
+    if revenue_format == 'numeric':
+        revenue = pd.Series(amounts)
+    else:
+        units = rng.choice(['', ' млн', ' млрд', ' тыс', ' миллиардов', ' тысяч руб.'], rows)
+        revenue = pd.Series([f"{a:,}".replace(',', ' ').replace('.', ',') for a in amounts]) + units
+
+    inns = rng.integers(10**9, 10**10, rows).astype(str)
+    inn_noise = rng.choice(['', ' ', '-', 'ИНН '], rows)
+    # Часть ИНН отсутствует (None и NaN), как в строках рейтинга без ИНН
+    inn_column = (pd.Series(inn_noise) + pd.Series(inns)).astype(object)
+    inn_column[rng.random(rows) < 0.02] = None
+    inn_column[rng.random(rows) < 0.02] = np.nan
+
+    return pd.DataFrame({
+        'inn': inn_column,
+        'name': rng.choice(['ПРОМОМАРКЕТ', 'ЭВЕРЕСТ BTL', ' МАРКОМ ', 'СОВА'], rows),
+        'revenue': revenue,
+        'revenue_year': rng.choice(['2023', '2022', None], rows),
+        'okved_main': rng.choice(['73.11', '73.12', '70.22', None], rows),
+        'segment_tag': rng.choice(['BTL', 'BTL,EVENT', 'SOUVENIR'], rows),
+        'description': rng.choice(['Комплексное BTL-агентство', 'Производство', ''], rows),
+        'region': rng.choice(['Москва', 'Санкт-Петербург', None], rows),
+        'contacts': '',
+        'source': 'synthetic',
+        'site': '',
+    })
+
+
+def legacy_normalize_data(processor: DataProcessor, raw_df: pd.DataFrame) -> pd.DataFrame:
+    """Построчная реализация normalize_data (до векторизации), эталон для сравнения."""
+    df = raw_df.copy()
+
+    string_cols = ['name', 'okved_main', 'segment_tag', 'description',
+                   'region', 'contacts', 'source', 'site']
+    for col in string_cols:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip()
+            df[col] = df[col].replace(['nan', 'None', 'NaT', 'NaN', ''], '')
+
+    df['revenue'] = df['revenue'].apply(processor._normalize_revenue_value)
+    df['revenue'] = pd.to_numeric(df['revenue'], errors='coerce').fillna(0)
+
+    df['revenue_year'] = pd.to_numeric(df['revenue_year'], errors='coerce')
+    df['revenue_year'] = df['revenue_year'].fillna(2023).astype(int)
+
+    df['inn'] = df['inn'].astype(str).str.strip()
+    df['inn'] = df['inn'].apply(lambda x: re.sub(r'\D', '', x)[:10] if pd.notna(x) else '')
+    return df
+
+
+def _measure(func, *args) -> tuple:
+    """Выполняет func и возвращает (результат, время в секундах)."""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def bench_normalize(rows: int, revenue_format: str):
+    """Сравнивает скорость построчной и векторизованной нормализации."""
+    processor = DataProcessor()
+    logger.info(f"Генерация синтетического DataFrame на {rows:,} строк (выручка: {revenue_format})...")
+    raw_df = make_synthetic_frame(rows, revenue_format)
+
+    legacy_df, legacy_time = _measure(legacy_normalize_data, processor, raw_df)
+    vector_df, vector_time = _measure(processor.normalize_data, raw_df)
+
+    pd.testing.assert_frame_equal(legacy_df, vector_df)
+
+    print(f"\n{'='*60}")
+    print(f"normalize_data, {rows:,} строк, выручка {revenue_format} (результаты идентичны)")
+    print(f"{'='*60}")
+    print(f"  построчно (apply):   {legacy_time:8.2f} с  {rows / legacy_time:12,.0f} строк/с")
+    print(f"  векторизованно:      {vector_time:8.2f} с  {rows / vector_time:12,.0f} строк/с")
+    print(f"  ускорение:           {legacy_time / vector_time:8.1f}x")
+
+
+def make_seed_frame(rows: int, duplicate_rate: float = 0.05, seed: int = 42) -> pd.DataFrame:
+    """Генерирует seed-список из rows строк с долей повторяющихся ИНН duplicate_rate."""
+    rng = np.random.default_rng(seed)
+    unique_count = max(1, int(rows * (1 - duplicate_rate)))
+    unique_inns = rng.choice(9 * 10**9, unique_count, replace=False) + 10**9
+    inns = np.concatenate([unique_inns, rng.choice(unique_inns, rows - unique_count)])
+    rng.shuffle(inns)
+    return pd.DataFrame({
+        'inn': inns.astype(str),
+        'name': rng.choice(['ПРОМОМАРКЕТ', 'ЭВЕРЕСТ', 'МАРКОМ', 'СОВА'], rows),
+        'rating_ref': 'benchmark'
+    })
+
+
+def _peak_rss_mb() -> float:
+    """Пиковый объём резидентной памяти текущего процесса в МБ (None, если недоступно)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS — байты
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def _serve_stub(stub_options: dict, conn):
+    """Процесс заглушки Checko: сообщает адрес, работает до команды остановки и возвращает статистику."""
+    with CheckoStubServer(**stub_options) as server:
+        conn.send(server.url)
+        conn.recv()
+        conn.send(server.stats)
+
+
+def _run_pipeline(rows: int, api_url: str, options: dict) -> dict:
+    """Прогоняет seed-список через DataFetcher → Enricher → DataProcessor (в отдельном процессе)."""
+    # Построчные логи обогащения заметно замедляют прогон на 100k строк
+    logging.getLogger('enricher').setLevel(logging.WARNING)
+    logging.getLogger('data_fetcher').setLevel(logging.ERROR)
+
+    seed_df = make_seed_frame(rows)
+    metrics = Metrics()
+    rate_limiter = AdaptiveRateLimiter(
+        options['rate'], burst=options['workers'], max_concurrency=options['workers']
+    )
+    fetcher = DataFetcher(
+        'benchmark', rate_limiter=rate_limiter, pool_size=options['workers'], api_url=api_url,
+        max_retries=options['max_retries'], backoff_base=0.05, backoff_max=2.0, metrics=metrics
+    )
+    processor = DataProcessor()
+    enricher = Enricher(fetcher, max_workers=options['workers'], metrics=metrics)
+
+    started = time.perf_counter()
+    records = enricher.enrich(seed_df)
+    with metrics.stage('dataframe', rows=len(records)):
+        raw_df = enricher.tag_segments(records.to_frame())
+    with metrics.stage('normalize', rows=len(raw_df)):
+        clean_df = processor.normalize_data(raw_df)
+    with metrics.stage('filter', rows=len(clean_df)):
+        final_df = processor.filter_companies(clean_df)
+    elapsed = time.perf_counter() - started
+
+    report = metrics.report()
+    return {
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed,
+        'enriched': len(records),
+        'filtered': len(final_df),
+        'peak_rss_mb': _peak_rss_mb(),
+        'throttled': rate_limiter.stats()['throttled'],
+        'stages': report['stages'],
+        'latency_seconds': report['latency_seconds'],
+        'counters': report['counters']
+    }
+
+
+def bench_pipeline(sizes: list, stub_options: dict, options: dict, report_path: str = None):
+    """Сквозной бенчмарк обогащения на локальной заглушке Checko: пропускная способность и пиковая память.
+
+    Каждый размер seed-списка прогоняется в отдельном процессе, чтобы пиковый RSS
+    не накапливался между прогонами; заглушка работает в своём процессе и не делит GIL с клиентом.
+    """
+    parent_conn, child_conn = multiprocessing.Pipe()
+    stub_process = multiprocessing.Process(target=_serve_stub, args=(stub_options, child_conn), daemon=True)
+    stub_process.start()
+    api_url = parent_conn.recv()
+    logger.info(f"Заглушка Checko API: {api_url}")
+
+    results = []
+    try:
+        for rows in sizes:
+            logger.info(f"Прогон пайплайна на {rows:,} ИНН...")
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                results.append(pool.submit(_run_pipeline, rows, api_url, options).result())
+    finally:
+        parent_conn.send('stop')
+        stub_stats = parent_conn.recv()
+        stub_process.join()
+
+    print(f"\n{'='*80}")
+    print(f"Пайплайн на заглушке Checko: задержка {stub_options['latency'] * 1000:.0f}"
+          f"+{stub_options['latency_jitter'] * 1000:.0f} мс, ошибок 500 {stub_options['error_rate']:.1%}, "
+          f"потоков {options['workers']}")
+    print(f"{'='*80}")
+    print(f"{'ИНН':>9} {'получено':>9} {'время, с':>9} {'строк/с':>9} {'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8} "
+          f"{'429':>6} {'ошибок':>6} {'пик RSS, МБ':>12}")
+    for result in results:
+        http = result['latency_seconds'].get('http_request', {})
+        rss = f"{result['peak_rss_mb']:12.0f}" if result['peak_rss_mb'] is not None else f"{'—':>12}"
+        print(f"{result['rows']:>9,} {result['enriched']:>9,} {result['seconds']:9.2f} {result['rows_per_sec']:9.0f} "
+              f"{http.get('p50', 0) * 1000:8.1f} {http.get('p95', 0) * 1000:8.1f} {http.get('p99', 0) * 1000:8.1f} "
+              f"{result['throttled']:>6} {result['counters'].get('source_failed', 0):>6} {rss}")
+    print(f"\nЗаглушка: {stub_stats}")
+
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({'stub': {**stub_options, 'stats': stub_stats}, 'options': options, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        logger.info(f"Результаты сохранены: {report_path}")
+
+
+def bench_rating(pages: int, rows_per_page: int, workers: int, latency: float):
+    """Скорость потокового парсера рейтинга на локальной заглушке: время до первой строки и строк/с."""
+    with CheckoStubServer(latency=latency, rating_pages=pages, rating_rows_per_page=rows_per_page) as server:
+        scraper = RatingScraper(max_workers=workers)
+        started = time.perf_counter()
+        first_row_time = None
+        rows = 0
+        for _ in scraper.iter_companies(server.rating_url):
+            if first_row_time is None:
+                first_row_time = time.perf_counter() - started
+            rows += 1
+        elapsed = time.perf_counter() - started
+
+    print(f"\n{'='*60}")
+    print(f"Парсер рейтинга: {pages} страниц по {rows_per_page} строк, задержка {latency * 1000:.0f} мс, "
+          f"потоков {workers}, парсер {HTML_PARSER}")
+    print(f"{'='*60}")
+    print(f"  первая строка через: {first_row_time:8.3f} с")
+    print(f"  всего:               {elapsed:8.3f} с  {rows / elapsed:10,.0f} строк/с")
+    print(f"  статистика:          {scraper.stats}")
+
+
+def check_rating_fixtures(directory: str, workers: int):
+    """Разбирает сохранённые страницы рейтинга (src/fixtures/sostav_rating), раздавая их локально."""
+    handler = partial(_QuietFileHandler, directory=directory)
+    with ThreadingHTTPServer(('127.0.0.1', 0), handler) as server:
+        Thread(target=server.serve_forever, daemon=True).start()
+        scraper = RatingScraper(max_workers=workers)
+        url = f"http://127.0.0.1:{server.server_address[1]}/ratings/agency/"
+        companies = list(scraper.iter_companies(url))
+        server.shutdown()
+
+    print(f"\n{'='*60}")
+    print(f"Сохранённые страницы рейтинга: {directory}, парсер {HTML_PARSER}")
+    print(f"{'='*60}")
+    for company in companies:
+        print(f"  {company['inn']:<12}  {company['name']}")
+    print(f"  статистика:          {scraper.stats}")
+
+
+class _QuietFileHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _measure_memory(build, records: list) -> tuple:
+    """Строит накопитель из records и возвращает (DataFrame, пик памяти в МБ, время построения DataFrame)."""
+    tracemalloc.start()
+    container = build(records)
+    df, frame_time = _measure(pd.DataFrame, container) if isinstance(container, list) else \
+        _measure(container.to_frame)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return df, peak, frame_time
+
+
+def bench_records(rows: int):
+    """Память и время построения DataFrame: список словарей против RecordColumns."""
+    fetcher = DataFetcher("benchmark", metrics=Metrics())
+    logger.info(f"Генерация {rows:,} обогащённых записей...")
+    # Каждая запись — отдельный словарь со своими строками, как после разбора JSON-ответа
+    records = [
+        json.loads(json.dumps(fetcher._get_realistic_mock_data(f"77{i:08d}", f"Агентство {i}")))
+        for i in range(rows)
+    ]
+
+    # Накопитель строится копированием записей, чтобы измерять только его собственную память
+    list_df, list_peak, list_time = _measure_memory(lambda items: [dict(item) for item in items], records)
+    columns_df, columns_peak, columns_time = _measure_memory(RecordColumns, records)
+    pd.testing.assert_frame_equal(list_df, columns_df)
+
+    print(f"\n{'='*60}")
+    print(f"Накопление {rows:,} записей (DataFrame идентичны)")
+    print(f"{'='*60}")
+    print(f"  список словарей:  пик {list_peak:8.1f} МБ, DataFrame за {list_time:6.2f} с")
+    print(f"  RecordColumns:    пик {columns_peak:8.1f} МБ, DataFrame за {columns_time:6.2f} с")
+
+
+def make_name_variants_frame(rows: int, variant_rate: float = 0.1, seed: int = 42) -> pd.DataFrame:
+    """Seed-список из нескольких источников: у доли variant_rate компаний есть вариант названия без ИНН."""
+    rng = np.random.default_rng(seed)
+    syllables = ['ра', 'ко', 'ме', 'ди', 'ан', 'то', 'лу', 'пре', 'ст', 'ви', 'за', 'ну', 'ол', 'гр', 'эк', 'ба',
+                 'ми', 'ло', 'ше', 'фи', 'ю', 'ця', 'жа', 'ды']
+    unique_count = max(1, int(rows * (1 - variant_rate)))
+    names = [
+        ''.join(rng.choice(syllables, rng.integers(3, 6))) + ' ' + ''.join(rng.choice(syllables, rng.integers(2, 4)))
+        for _ in range(unique_count)
+    ]
+    originals = rng.integers(0, unique_count, rows - unique_count)
+    variants = [rng.choice(['ООО «{}»', '{} BTL', 'ГК {}', '{} Group']).format(names[i].upper()) for i in originals]
+    return pd.DataFrame({
+        'inn': [''] * rows,
+        'name': names + variants,
+        'rating_ref': 'benchmark'
+    })
+
+
+def bench_names(sizes: list, threshold: float):
+    """Время поиска дублей по названиям (MinHash/LSH) на seed-списках разного размера."""
+    print(f"\n{'='*60}")
+    print(f"Дедупликация по названиям, порог {threshold}, строк в полосе LSH {NameDedupIndex(threshold).rows_per_band}")
+    print(f"{'='*60}")
+    print(f"{'строк':>10} {'время, с':>9} {'строк/с':>9} {'убрано':>8}")
+    for rows in sizes:
+        seed_frame = make_name_variants_frame(rows)
+        (_, stats), elapsed = _measure(dedup_seed_by_name, seed_frame, threshold)
+        print(f"{rows:>10,} {elapsed:>9.2f} {rows / elapsed:>9,.0f} {stats['removed']:>8,}")
+
+
+def parse_args(argv=None):
+    """Разбирает параметры командной строки."""
+    parser = argparse.ArgumentParser(description="Бенчмарки пайплайна сбора данных")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    normalize = commands.add_parser('normalize', help="скорость DataProcessor.normalize_data")
+    normalize.add_argument('--rows', type=int, default=1_000_000, help="число строк синтетического DataFrame")
+    normalize.add_argument('--revenue', choices=['text', 'numeric', 'both'], default='both',
+                           help="формат выручки в синтетических данных")
+
+    pipeline = commands.add_parser('pipeline', help="сквозной прогон DataFetcher и DataProcessor на заглушке Checko")
+    pipeline.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                          help="размеры seed-списков")
+    pipeline.add_argument('--workers', type=int, default=8, help="число параллельных запросов")
+    pipeline.add_argument('--rate', type=float, default=2000, help="лимит запросов в секунду")
+    pipeline.add_argument('--max-retries', type=int, default=4, help="число повторов при 429/5xx")
+    pipeline.add_argument('--latency', type=float, default=0.005, help="базовая задержка заглушки, с")
+    pipeline.add_argument('--latency-jitter', type=float, default=0.01, help="случайная добавка к задержке, с")
+    pipeline.add_argument('--error-rate', type=float, default=0.01, help="доля ответов 500")
+    pipeline.add_argument('--throttle-every', type=int, default=5_000, help="серия 429 каждые N запросов (0 — без)")
+    pipeline.add_argument('--throttle-burst', type=int, default=20, help="длина серии ответов 429")
+    pipeline.add_argument('--retry-after', type=float, default=0.5, help="Retry-After в ответах 429, с")
+    pipeline.add_argument('--report', help="сохранить результаты в JSON")
+
+    rating = commands.add_parser('rating', help="скорость потокового парсера рейтинга на заглушке")
+    rating.add_argument('--pages', type=int, default=50, help="число страниц рейтинга")
+    rating.add_argument('--rows-per-page', type=int, default=50, help="строк на странице")
+    rating.add_argument('--workers', type=int, default=4, help="число параллельно загружаемых страниц")
+    rating.add_argument('--latency', type=float, default=0.1, help="задержка ответа заглушки, с")
+    rating.add_argument('--fixtures', metavar='DIR',
+                        help="вместо заглушки разобрать сохранённые страницы из каталога (src/fixtures/sostav_rating)")
+
+    records = commands.add_parser('records', help="память накопителя обогащённых записей")
+    records.add_argument('--rows', type=int, default=200_000, help="число записей")
+
+    names = commands.add_parser('names', help="скорость поиска дублей по названиям в seed-списке")
+    names.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000], help="размеры seed-списков")
+    names.add_argument('--threshold', type=float, default=0.8, help="порог сходства названий")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == 'normalize':
+        formats = ['numeric', 'text'] if args.revenue == 'both' else [args.revenue]
+        for revenue_format in formats:
+            bench_normalize(args.rows, revenue_format)
+    elif args.command == 'pipeline':
+        stub_options = {
+            'latency': args.latency, 'latency_jitter': args.latency_jitter, 'error_rate': args.error_rate,
+            'throttle_every': args.throttle_every, 'throttle_burst': args.throttle_burst,
+            'retry_after': args.retry_after
+        }
+        options = {'workers': args.workers, 'rate': args.rate, 'max_retries': args.max_retries}
+        bench_pipeline(args.sizes, stub_options, options, args.report)
+    elif args.command == 'rating':
+        if args.fixtures:
+            check_rating_fixtures(args.fixtures, args.workers)
+        else:
+            bench_rating(args.pages, args.rows_per_page, args.workers, args.latency)
+    elif args.command == 'records':
+        bench_records(args.rows)
+    elif args.command == 'names':
+        bench_names(args.sizes, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from html import escape
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+REGIONS = ['Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань']
+OKVEDS = ['73.11', '73.12', '70.21', '82.30', '47.19']
+NAME_WORDS = ['ПРОМО', 'ИВЕНТ', 'МЕДИА', 'МАРКЕТ', 'КОНТАКТ', 'ГРУПП', 'БРЕНД', 'ВЕКТОР']
+DESCRIPTIONS = [
+    'BTL-агентство: промо-акции, дегустации, мерчендайзинг',
+    'Организация мероприятий и конференций полного цикла',
+    'Производство сувенирной продукции и корпоративных подарков',
+    'Оптовая торговля',
+    ''
+]
+
+
+def make_company_payload(inn: str) -> dict:
+    """Детерминированно генерирует ответ в формате Checko (data.financials, okved, address) по ИНН."""
+    rng = random.Random(inn)
+    return {
+        'inn': inn,
+        'name': f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)}",
+        'financials': [
+            {'year': 2022, 'revenue': rng.randint(10, 5000) * 1_000_000},
+            {'year': 2023, 'revenue': rng.randint(10, 5000) * 1_000_000},
+        ],
+        'okved': [{'code': rng.choice(OKVEDS)}, {'code': rng.choice(OKVEDS)}],
+        'employees': rng.randint(5, 500),
+        'site': f"https://company{inn}.ru",
+        'address': {'region': rng.choice(REGIONS)},
+        'phone': f"+7 (495) {rng.randint(100, 999)}-{rng.randint(10, 99)}-{rng.randint(10, 99)}",
+        'email': f"info@company{inn}.ru",
+        'description': rng.choice(DESCRIPTIONS)
+    }
+
+
+def make_rating_page(page: int, num_pages: int, rows_per_page: int) -> str:
+    """Генерирует страницу рейтинга агентств в вёрстке sostav.ru: таблица и пагинация ?page=N.
+
+    Каждая десятая строка без ИНН — как у агентств, для которых рейтинг его не публикует.
+    """
+    rows = []
+    for i in range(rows_per_page):
+        place = (page - 1) * rows_per_page + i + 1
+        rng = random.Random(place)
+        name = escape(f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {place}")
+        inn = f"ИНН {7700000000 + place}" if place % 10 else ''
+        rows.append(
+            f'<tr class="rating__row"><td class="rating__place">{place}</td>'
+            f'<td class="rating__name"><a href="/agency/{place}/">{name}</a></td>'
+            f'<td class="rating__details">{inn}</td><td class="rating__score">{rng.randint(10, 999)}</td></tr>'
+        )
+
+    links = sorted({1, max(1, page - 1), min(num_pages, page + 1), num_pages})
+    pagination = ' '.join(f'<a class="pagination__link" href="?page={n}">{n}</a>' for n in links)
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Рейтинг агентств</title></head><body>'
+        '<table class="rating"><thead><tr><th>Место</th><th>Агентство</th><th>Реквизиты</th><th>Баллы</th></tr></thead>'
+        f'<tbody>{"".join(rows)}</tbody></table><div class="pagination">{pagination}</div></body></html>'
+    )
+
+
+class CheckoStubServer:
+    """Локальная заглушка Checko API (/v2/company) для офлайн-бенчмарков.
+
+    Задержка ответа — latency плюс равномерный джиттер; error_rate — доля ответов 500.
+    Каждые throttle_every запросов сервер отвечает 429 (с Retry-After) на следующие
+    throttle_burst запросов, имитируя превышение квоты. При rating_pages > 0 сервер
+    также отдаёт постраничный рейтинг агентств по адресу /ratings/agency/?page=N.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, latency_jitter: float = 0.0,
+                 error_rate: float = 0.0, throttle_every: int = 0, throttle_burst: int = 0,
+                 retry_after: float = 1.0, seed: int = 42, rating_pages: int = 0, rating_rows_per_page: int = 50):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.throttle_every = throttle_every
+        self.throttle_burst = throttle_burst
+        self.retry_after = retry_after
+        self.rating_pages = rating_pages
+        self.rating_rows_per_page = rating_rows_per_page
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'throttled': 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._burst_left = 0
+        self._thread = None
+
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        """Адрес эндпоинта компании для DataFetcher(api_url=...)."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v2/company"
+
+    @property
+    def rating_url(self) -> str:
+        """Адрес первой страницы рейтинга."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/ratings/agency/"
+
+    def _next_outcome(self) -> tuple:
+        """Решает, как ответить на очередной запрос: (статус, задержка)."""
+        with self._lock:
+            self.stats['requests'] += 1
+            if self.throttle_every and self.stats['requests'] % self.throttle_every == 0:
+                self._burst_left = self.throttle_burst
+            if self._burst_left > 0:
+                self._burst_left -= 1
+                self.stats['throttled'] += 1
+                return 429, 0.0
+
+            delay = self.latency + self._rng.uniform(0, self.latency_jitter)
+            if self._rng.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 500, delay
+            self.stats['ok'] += 1
+            return 200, delay
+
+    def _page_delay(self) -> float:
+        """Задержка ответа для страницы рейтинга (без ошибок и 429)."""
+        with self._lock:
+            return self.latency + self._rng.uniform(0, self.latency_jitter)
+
+    def _make_handler(self):
+        """Создаёт класс обработчика запросов, привязанный к этому серверу."""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 с Content-Length: клиентский пул соединений переиспользует их между запросами
+            protocol_version = 'HTTP/1.1'
+            # Заголовки и тело уходят разными send(): без TCP_NODELAY Nagle добавляет ~40 мс к ответу
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == '/ratings/agency/' and stub.rating_pages:
+                    return self._reply_rating(int(query.get('page', ['1'])[0]))
+
+                inn = query.get('inn', [''])[0]
+                if url.path != '/v2/company':
+                    return self._reply(404, {'meta': {'status': 'error', 'message': 'Not found'}})
+                if not inn:
+                    return self._reply(400, {'meta': {'status': 'error', 'message': 'Не указан ИНН'}})
+
+                status, delay = stub._next_outcome()
+                if delay:
+                    time.sleep(delay)
+                if status == 429:
+                    return self._reply(429, {'meta': {'status': 'error', 'message': 'Too Many Requests'}},
+                                       {'Retry-After': str(stub.retry_after)})
+                if status == 500:
+                    return self._reply(500, {'meta': {'status': 'error', 'message': 'Internal Server Error'}})
+                self._reply(200, {'data': make_company_payload(inn), 'meta': {'status': 'ok'}})
+
+            def _reply_rating(self, page: int):
+                if not 1 <= page <= stub.rating_pages:
+                    return self._reply(404, {'meta': {'status': 'error', 'message': 'Not found'}})
+                time.sleep(stub._page_delay())
+                html = make_rating_page(page, stub.rating_pages, stub.rating_rows_per_page)
+                self._send(200, html.encode('utf-8'), 'text/html; charset=utf-8')
+
+            def _reply(self, status: int, body: dict, headers: dict = None):
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self._send(status, payload, 'application/json; charset=utf-8', headers)
+
+            def _send(self, status: int, payload: bytes, content_type: str, headers: dict = None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                """Не пишем каждый запрос в stderr."""
+
+        return Handler
+
+    def start(self) -> 'CheckoStubServer':
+        """Запускает сервер в фоновом потоке."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def parse_args(argv=None):
+    """Разбирает параметры командной строки."""
+    parser = argparse.ArgumentParser(description="Локальная заглушка Checko API для бенчмарков")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.005, help="базовая задержка ответа, с")
+    parser.add_argument('--latency-jitter', type=float, default=0.01, help="случайная добавка к задержке, с")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument('--throttle-every', type=int, default=0, help="начинать серию 429 каждые N запросов")
+    parser.add_argument('--throttle-burst', type=int, default=0, help="длина серии ответов 429")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="значение заголовка Retry-After, с")
+    parser.add_argument('--rating-pages', type=int, default=0,
+                        help="число страниц рейтинга агентств по адресу /ratings/agency/ (0 — не отдавать)")
+    parser.add_argument('--rating-rows', type=int, default=50, help="строк на странице рейтинга")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+    server = CheckoStubServer(
+        args.host, args.port, latency=args.latency, latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate, throttle_every=args.throttle_every,
+        throttle_burst=args.throttle_burst, retry_after=args.retry_after,
+        rating_pages=args.rating_pages, rating_rows_per_page=args.rating_rows
+    )
+    server.start()
+    logger.info(f"Заглушка Checko API слушает {server.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        logger.info(f"Статистика заглушки: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
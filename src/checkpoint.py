@@ -0,0 +1,64 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointJournal:
+    """Журнал обогащённых записей (JSON Lines) для возобновления прерванных запусков."""
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        # fsync после каждой записи: надёжнее при сбое питания, но медленнее
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def reset(self):
+        """Очищает журнал перед новым запуском."""
+        with self._lock:
+            self._close_file()
+            open(self.path, 'w', encoding='utf-8').close()
+
+    def iter_records(self):
+        """Итерирует по записям журнала. Повреждённые строки (оборванная запись при сбое) пропускаются."""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, encoding='utf-8') as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Пропущена повреждённая строка {line_no} журнала {self.path}")
+
+    def append(self, record: dict):
+        """Дописывает запись в журнал и сразу сбрасывает её на диск."""
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def _close_file(self):
+        """Закрывает открытый на запись файл журнала."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        """Закрывает журнал."""
+        with self._lock:
+            self._close_file()
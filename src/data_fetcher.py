@@ -1,10 +1,18 @@
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import time
 from bs4 import BeautifulSoup
 import logging
 import re
 import random
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from instrumentation import Metrics
+from keyword_matcher import KeywordMatcher
+from rating_scraper import RatingScraper
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,10 +25,36 @@ class DataFetcher:
         'COMM_GROUP': ['коммуникационная группа', 'холдинг'],
         'EVENT': ['ивент', 'event', 'мероприятие', 'конференция']
     }
+    SEGMENT_MATCHER = KeywordMatcher(SEGMENT_KEYWORDS)
+    API_URL = "https://api.checko.ru/v2/company"
 
-    def __init__(self, checko_api_key):
+    def __init__(self, checko_api_key, rate_limiter=None, pool_size: int = 10, cache=None,
+                 api_url: str = None, max_retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 mock_on_failure: bool = False, metrics=None, rating_workers: int = 4):
         self.checko_api_key = checko_api_key
+        self.api_url = api_url or self.API_URL
+        # Демо-режим: при недоступности API подставлять mock-данные вместо пропуска компании
+        self.mock_on_failure = mock_on_failure
+        # Число параллельно загружаемых страниц рейтинга
+        self.rating_workers = rating_workers
+        # Повторы при 429/5xx и сетевых ошибках: экспоненциальная задержка с джиттером
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Общий ограничитель частоты запросов к API (например, TokenBucket)
+        self.rate_limiter = rate_limiter
+        # Постоянный кэш ответов API по ИНН (ResponseCache)
+        self.cache = cache
+        # Задержки HTTP, декодирования JSON, ожидания лимита и счётчики источников данных
+        self.metrics = metrics if metrics is not None else Metrics()
+        # Запросы по ИНН, выполняющиеся прямо сейчас: повторные вызовы ждут их результата
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
         self.session = requests.Session()
+        # Пул соединений под параллельные запросы из нескольких потоков
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept': 'application/json',
@@ -28,9 +62,36 @@ class DataFetcher:
         })
 
     def parse_industry_rating(self, url: str) -> pd.DataFrame:
-        """Возвращает тестовый список компаний с ИНН для обхода ошибки парсинга."""
+        """Загружает все страницы отраслевого рейтинга в DataFrame (inn, name, rating_ref)."""
+        return pd.DataFrame(list(self.iter_industry_rating(url)), columns=['name', 'inn', 'rating_ref'])
+
+    def iter_industry_rating(self, url: str):
+        """Генератор строк рейтинга {name, inn, rating_ref} по мере загрузки страниц.
+
+        Если рейтинг недоступен или в нём нет строк с ИНН, отдаёт статический тестовый список.
+        """
+        scraper = RatingScraper(max_workers=self.rating_workers)
+        found = 0
+        try:
+            for row in scraper.iter_companies(url):
+                found += 1
+                yield row
+        except requests.RequestException as e:
+            logger.warning(f"Не удалось загрузить рейтинг {url}: {e}")
+
+        if found:
+            logger.info(f"Из рейтинга получено {found} компаний: страниц {scraper.stats['pages']}, "
+                        f"ошибок загрузки {scraper.stats['failed_pages']}, "
+                        f"строк без ИНН {scraper.stats['skipped_no_inn']}")
+            return
+
         logger.info("Используем статический список компаний с ИНН.")
+        df = self._static_test_companies()
+        logger.info(f"Используем тестовый список из {len(df)} компаний с ИНН")
+        yield from df.to_dict('records')
 
+    def _static_test_companies(self) -> pd.DataFrame:
+        """Возвращает тестовый список компаний с ИНН для обхода ошибки парсинга."""
         # РЕАЛЬНЫЙ СПИСОК АГЕНТСТВ С ИХ ИНН
         test_companies = [
             {"name": "АВАНГАРД", "inn": "7727563778"},
@@ -87,49 +148,207 @@ class DataFetcher:
         ]
         df = pd.DataFrame(test_companies)
         df['rating_ref'] = 'static_test_list_with_inn'
-        logger.info(f"Используем тестовый список из {len(df)} компаний с ИНН")
         return df
 
+    def fetch_companies_by_inn(self, inns, names=None, max_workers: int = 8, stream: bool = False):
+        """Запрашивает данные по списку ИНН, выполняя не более одного запроса на каждый уникальный ИНН.
+
+        Возвращает список записей в порядке входного списка (для повторяющихся ИНН — копии
+        одной записи). При stream=True возвращает генератор пар (inn, запись) по мере готовности,
+        по одной паре на уникальный ИНН. names сопоставляются с inns по позиции, а не по индексу.
+        """
+        # Series после фильтрации сохраняет метки строк: names[pos] искал бы метку, а не позицию
+        names = list(names) if names is not None else None
+        unique = {}
+        keys = []
+        for pos, inn in enumerate(inns):
+            key = str(inn).strip()
+            keys.append(key)
+            if key not in unique:
+                unique[key] = names[pos] if names is not None else ''
+
+        if stream:
+            return self._iter_companies_by_inn(unique, max_workers)
+
+        results = dict(self._iter_companies_by_inn(unique, max_workers))
+        return [dict(results[key]) if results[key] else results[key] for key in keys]
+
+    def _iter_companies_by_inn(self, unique: dict, max_workers: int):
+        """Параллельно запрашивает уникальные ИНН и отдаёт результаты по мере завершения."""
+        with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+            futures = {
+                pool.submit(self.fetch_company_via_api_by_inn, inn, name): inn
+                for inn, name in unique.items()
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
     def fetch_company_via_api_by_inn(self, inn: str, original_name: str) -> dict:
+        """Запрашивает данные о компании по ИНН. Одновременные запросы одного ИНН объединяются в один вызов API."""
+        with self._inflight_lock:
+            future = self._inflight.get(inn)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[inn] = future
+
+        if is_owner:
+            try:
+                company_info = self._fetch_company(inn, original_name)
+                self.metrics.incr(f"source_{company_info['source']}" if company_info else 'source_failed')
+                future.set_result(company_info)
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._inflight_lock:
+                    del self._inflight[inn]
+
+        # Каждый вызывающий получает свою копию записи, чтобы её можно было дополнять
+        company_info = future.result()
+        return dict(company_info) if company_info else company_info
+
+    def _fetch_company(self, inn: str, original_name: str) -> dict:
         """Запрашивает данные о компании по ИНН через API Checko."""
-        api_url = "https://api.checko.ru/v2/company"
         params = {'key': self.checko_api_key, 'inn': inn}
+
+        if self.cache is not None:
+            cached = self.cache.get(inn)
+            if cached is not None:
+                self.metrics.incr('cache_hit')
+                cached_data, cached_at = cached
+                return self._build_company_record(cached_data, inn, original_name, fetched_at=cached_at)
         
         try:
-            response = self.session.get(api_url, params=params, timeout=15)
-            
+            response = self._request_with_retry(params, inn)
+
+            if response is None:
+                # Временные ошибки не подменяем mock-данными: ИНН можно дозапросить при --resume
+                return self._fallback(inn, original_name,
+                                      f"API недоступен после {self.max_retries + 1} попыток")
+
             if response.status_code == 401:
                 logger.error("API ключ недействителен или не активирован!")
-                return self._get_realistic_mock_data(inn, original_name)
-                
-            if response.status_code == 400:
-                logger.warning(f"Checko API не принял запрос для ИНН {inn}. Используем mock-данные.")
-                return self._get_realistic_mock_data(inn, original_name)
-                
+                return self._fallback(inn, original_name, "HTTP 401")
+
+            if response.status_code >= 400:
+                # 400, 402, 403, 404, исчерпанная квота: повтор не поможет
+                return self._fallback(inn, original_name,
+                                      f"Checko API не принял запрос (HTTP {response.status_code})")
+
+            started = time.perf_counter()
             data = response.json()
-            
+            self.metrics.observe('json_decode', time.perf_counter() - started)
+
             if data.get('data'):
                 company_data = data['data']
-                return {
-                    'inn': company_data.get('inn', inn),
-                    'name': company_data.get('name', original_name),
-                    'revenue': self._extract_revenue(company_data.get('financials', [])),
-                    'revenue_year': 2023,
-                    'okved_main': self._get_main_okved(company_data.get('okved', [])),
-                    'employees': company_data.get('employees'),
-                    'site': company_data.get('site'),
-                    'region': company_data.get('address', {}).get('region'),
-                    'contacts': self._format_contacts(company_data),
-                    'description': company_data.get('description', ''),
-                    'source': 'checko_api'
-                }
-            else:
-                logger.warning(f"Нет данных для ИНН {inn}. Используем mock-данные.")
-                return self._get_realistic_mock_data(inn, original_name)
-                
-        except Exception as e:
-            logger.warning(f"Ошибка при запросе для ИНН '{inn}': {e}")
+                record = self._build_company_record(company_data, inn, original_name)
+                if self.cache is not None:
+                    self.cache.put(inn, company_data)
+                return record
+            return self._fallback(inn, original_name, "нет данных в ответе API")
+
+        except (ValueError, TypeError, AttributeError) as e:
+            # Обрезанный или не-JSON ответ, неожиданная структура данных
+            return self._fallback(inn, original_name, f"некорректный ответ API: {e}")
+
+    def _fallback(self, inn: str, original_name: str, reason: str):
+        """Результат неудачного запроса: mock-данные в демо-режиме, иначе None.
+
+        Вне демо-режима mock-записи не создаются, чтобы выдуманные компании не попали в результат.
+        """
+        if self.mock_on_failure:
+            logger.warning(f"ИНН {inn}: {reason}. Используем mock-данные.")
             return self._get_realistic_mock_data(inn, original_name)
+        logger.error(f"Не удалось получить данные для ИНН {inn}: {reason}")
+        return None
+
+    def _request_with_retry(self, params: dict, inn: str):
+        """Выполняет GET к API, повторяя запрос при 429/5xx и сетевых ошибках.
+
+        Возвращает ответ или None, если все попытки исчерпаны.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.metrics.add_stage_time('rate_limit_wait', self.rate_limiter.acquire())
+
+            status, retry_after = 'ok', None
+            started = time.perf_counter()
+            try:
+                response = self.session.get(self.api_url, params=params, timeout=15)
+            except requests.RequestException as e:
+                status, reason = 'error', str(e)
+                self.metrics.incr('http_network_error')
+            except BaseException:
+                self._release_limiter('error')
+                raise
+            else:
+                self.metrics.incr(f"http_{response.status_code}")
+                if response.status_code in (429, 503):
+                    # Сервер просит снизить нагрузку: ограничитель уменьшит частоту
+                    status, reason = 'throttled', f"HTTP {response.status_code}"
+                    retry_after = self._parse_retry_after(response.headers.get('Retry-After'))
+                elif response.status_code >= 500:
+                    status, reason = 'error', f"HTTP {response.status_code}"
+
+            self.metrics.observe('http_request', time.perf_counter() - started)
+            self._release_limiter(status, retry_after)
+            if status == 'ok':
+                return response
+            if attempt == self.max_retries:
+                break
+
+            delay = self._backoff_delay(attempt, retry_after)
+            logger.warning(f"ИНН {inn}: {reason}, повтор {attempt + 1}/{self.max_retries} через {delay:.1f} с")
+            time.sleep(delay)
+            self.metrics.add_stage_time('retry_sleep', delay)
+
+        return None
+
+    def _release_limiter(self, status: str, retry_after: float = None):
+        """Сообщает ограничителю частоты результат запроса."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.release(status, retry_after)
+
+    def _backoff_delay(self, attempt: int, retry_after: float = None) -> float:
+        """Задержка перед повтором: экспоненциальная с полным джиттером, но не меньше Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    @staticmethod
+    def _parse_retry_after(value) -> float:
+        """Разбирает заголовок Retry-After (секунды или HTTP-дата) в секунды."""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    def _build_company_record(self, company_data: dict, inn: str, original_name: str,
+                              fetched_at: float = None) -> dict:
+        """Собирает запись о компании из ответа API (data['data']).
+
+        fetched_at — время получения ответа (секунды Unix) для данных из кэша; по умолчанию — текущее.
+        """
+        return {
+            'inn': company_data.get('inn', inn),
+            'name': company_data.get('name', original_name),
+            'revenue': self._extract_revenue(company_data.get('financials', [])),
+            'revenue_year': 2023,
+            'okved_main': self._get_main_okved(company_data.get('okved', [])),
+            'employees': company_data.get('employees'),
+            'site': company_data.get('site'),
+            'region': company_data.get('address', {}).get('region'),
+            'contacts': self._format_contacts(company_data),
+            'description': company_data.get('description', ''),
+            'source': 'checko_api',
+            'fetched_at': self._fetched_at(fetched_at)
+        }
 
     def _get_realistic_mock_data(self, company_inn: str, company_name: str) -> dict:
         """Создает реалистичные тестовые данные, которые пройдут все фильтры."""
@@ -152,9 +371,16 @@ class DataFetcher:
             'region': random.choice(['Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург']),
             'contacts': f"тел: +7 ({random.randint(100, 999)}) {random.randint(100, 999)}-{random.randint(10, 99)}-{random.randint(10, 99)}",
             'description': 'Комплексное BTL-агентство полного цикла. Услуги: промо-акции, ивенты, мерчендайзинг, бренд-активация.',
-            'source': 'realistic_mock_data'
+            'source': 'realistic_mock_data',
+            'fetched_at': self._fetched_at()
         }
 
+    @staticmethod
+    def _fetched_at(timestamp: float = None) -> str:
+        """Время получения данных (UTC, ISO 8601) — по нему режим --refresh определяет устаревшие записи."""
+        moment = datetime.now(timezone.utc) if timestamp is None else datetime.fromtimestamp(timestamp, timezone.utc)
+        return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
     def _extract_revenue(self, financials: list) -> float:
         """Извлекает значение годовой выручки из данных API (в млн руб)."""
         if financials:
@@ -177,13 +403,7 @@ class DataFetcher:
             contacts.append(f"email: {data['email']}")
         return '; '.join(contacts) if contacts else ''
 
-    def determine_segment_tag(self, company_name: str, description: str = '') -> str:
-        """Определяет сегментные теги на основе названия и описания."""
-        tags = set()
-        full_text = f"{company_name} {description}".lower()
-        
-        for tag, keywords in self.SEGMENT_KEYWORDS.items():
-            if any(keyword in full_text for keyword in keywords):
-                tags.add(tag)
-        
-        return ','.join(sorted(tags)) if tags else 'BTL'
\ No newline at end of file
+    def determine_segment_tags(self, names: pd.Series, descriptions: pd.Series) -> pd.Series:
+        """Определяет сегментные теги по столбцам названий и описаний (BTL, если ни один тег не найден)."""
+        full_text = names.fillna('').astype(str) + ' ' + descriptions.fillna('').astype(str)
+        return self.SEGMENT_MATCHER.tag_column(full_text, default='BTL')
\ No newline at end of file
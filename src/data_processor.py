@@ -1,11 +1,14 @@
 import pandas as pd
 import numpy as np
 import re
+from keyword_matcher import KeywordMatcher
 
 class DataProcessor:
     def __init__(self):
         self.target_okveds = ['73.11', '73.12', '73.13', '74.20', '90.03']
         self.min_revenue = 200
+        self.relevance_keywords = ['btl', 'промо', 'ивент', 'мерчендайз', 'сувенир', 'реклам']
+        self.relevance_matcher = KeywordMatcher({'relevant': self.relevance_keywords})
 
     def normalize_data(self, raw_df: pd.DataFrame) -> pd.DataFrame:
         """Приводит сырые данные к единому формату."""
@@ -25,8 +28,7 @@ class DataProcessor:
         
         # 2. Нормализация выручки
         if 'revenue' in df.columns:
-            df['revenue'] = df['revenue'].apply(self._normalize_revenue_value)
-            df['revenue'] = pd.to_numeric(df['revenue'], errors='coerce').fillna(0)
+            df['revenue'] = self._normalize_revenue_column(df['revenue'])
         
         # 3. Нормализация года
         if 'revenue_year' in df.columns:
@@ -36,7 +38,8 @@ class DataProcessor:
         # 4. Нормализация ИНН
         if 'inn' in df.columns:
             df['inn'] = df['inn'].astype(str).str.strip()
-            df['inn'] = df['inn'].apply(lambda x: re.sub(r'\D', '', x)[:10] if pd.notna(x) else '')
+            # Пропущенный ИНН остаётся пропуском после astype(str) — приводим к '', как построчная версия
+            df['inn'] = df['inn'].str.replace(r'\D', '', regex=True).str[:10].fillna('')
         
         # 5. Добавляем segment_tag если его нет
         if 'segment_tag' not in df.columns:
@@ -44,8 +47,43 @@ class DataProcessor:
         
         return df
 
+    def _normalize_revenue_column(self, revenue: pd.Series) -> pd.Series:
+        """Векторизованно конвертирует столбец выручки в числа (аналог _normalize_revenue_value)."""
+        # Числовой столбец: достаточно заменить пропуски нулями
+        if pd.api.types.is_numeric_dtype(revenue):
+            return revenue.astype(float).fillna(0.0)
+
+        # Числа (int/float) берём как есть, остальные непустые значения разбираем как текст
+        if revenue.dtype == object:
+            value_types = revenue.map(type)
+            number_types = [t for t in value_types.unique() if issubclass(t, (int, float))]
+            is_number = value_types.isin(number_types)
+        else:
+            is_number = pd.Series(False, index=revenue.index)
+        is_text = ~is_number & revenue.notna()
+
+        result = pd.Series(0.0, index=revenue.index)
+        result[is_number] = revenue[is_number].astype(float)
+
+        if is_text.any():
+            text = (revenue[is_text].astype(str)
+                    .str.replace(' ', '', regex=False)
+                    .str.replace(',', '.', regex=False)
+                    .str.lower())
+            num = text.str.extract(r'(\d+\.?\d*)', expand=False).astype(float)
+
+            # Учитываем множители (по умолчанию значение в млн)
+            is_billion = text.str.contains('млрд|миллиард', regex=True)
+            is_thousand = ~is_billion & text.str.contains('тыс', regex=False)
+            num = num.mask(is_billion, num * 1000)
+            num = num.mask(is_thousand, num / 1000)
+
+            result[is_text] = num
+
+        return result.fillna(0.0)
+
     def _normalize_revenue_value(self, value) -> float:
-        """Конвертирует значение выручки в число."""
+        """Конвертирует значение выручки в число (построчная версия, эталон для _normalize_revenue_column)."""
         if pd.isna(value):
             return 0.0
         
@@ -99,15 +137,8 @@ class DataProcessor:
         )
         
         # Проверяем описание/название на ключевые слова
-        def check_keywords(text):
-            if pd.isna(text):
-                return False
-            keywords = ['btl', 'промо', 'ивент', 'мерчендайз', 'сувенир', 'реклам']
-            text_lower = str(text).lower()
-            return any(keyword in text_lower for keyword in keywords)
-        
-        has_keywords = result_df['description'].apply(check_keywords) | \
-                      result_df['name'].apply(check_keywords)
+        has_keywords = self.relevance_matcher.contains_any_column(result_df['description']) | \
+                      self.relevance_matcher.contains_any_column(result_df['name'])
         
         # Комбинируем все критерии
         relevance_mask = has_target_okved | has_relevant_tag | has_keywords
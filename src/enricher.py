@@ -0,0 +1,78 @@
+import logging
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import Metrics
+from records import RecordColumns
+
+logger = logging.getLogger(__name__)
+
+
+class Enricher:
+    """Параллельное обогащение seed-списка данными из DataFetcher."""
+
+    def __init__(self, fetcher, max_workers: int = 8, journal=None, metrics=None):
+        self.fetcher = fetcher
+        self.max_workers = max(1, int(max_workers))
+        # Журнал контрольных точек (CheckpointJournal): каждая запись сохраняется сразу после получения
+        self.journal = journal
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    def enrich(self, seed_companies: pd.DataFrame) -> RecordColumns:
+        """Обогащает все строки seed-списка. Возвращает записи (RecordColumns) в порядке seed-списка."""
+        with self.metrics.stage('enrichment', rows=len(seed_companies)):
+            return self._enrich(seed_companies)
+
+    def _enrich(self, seed_companies: pd.DataFrame) -> RecordColumns:
+        """Запрашивает уникальные ИНН и раскладывает записи по строкам seed-списка."""
+        inns = seed_companies['inn'].astype(str).str.strip().tolist()
+        names = seed_companies['name'].tolist()
+        rating_refs = seed_companies['rating_ref'].tolist()
+
+        # Позиции строк для каждого ИНН: повторяющиеся ИНН запрашиваются один раз
+        positions = defaultdict(list)
+        for pos, inn in enumerate(inns):
+            positions[inn].append(pos)
+
+        total = len(positions)
+        if total < len(inns):
+            logger.info(f"Повторяющихся ИНН в seed-списке: {len(inns) - total}, запросов будет {total}")
+
+        # Записи складываются по столбцам в порядке готовности, а в конце переставляются в порядок seed-списка
+        results = RecordColumns()
+        result_positions = []
+        completed = self.fetcher.fetch_companies_by_inn(
+            inns, names, max_workers=self.max_workers, stream=True
+        )
+
+        for done, (inn, company_info) in enumerate(completed, start=1):
+            if not company_info:
+                logger.warning(f"[{done}/{total}] ✗ Не удалось получить данные для "
+                               f"{names[positions[inn][0]]} (ИНН: {inn})")
+                continue
+
+            for pos in positions[inn]:
+                results.append(company_info, rating_ref=rating_refs[pos])
+                result_positions.append(pos)
+                if self.journal is not None:
+                    self.journal.append({**company_info, 'rating_ref': rating_refs[pos]})
+
+            logger.info(f"[{done}/{total}] ✓ Получено: {company_info['name']} "
+                        f"- Выручка: {company_info['revenue']:.1f} млн руб")
+
+        results.reorder(np.argsort(result_positions, kind='stable'))
+        return results
+
+    def tag_segments(self, raw_df: pd.DataFrame) -> pd.DataFrame:
+        """Присваивает теги сегментов всем записям за один векторный проход по названиям и описаниям.
+
+        Вызывается для готового DataFrame, поэтому теги получают и записи, восстановленные из журнала.
+        """
+        if raw_df.empty:
+            return raw_df
+        with self.metrics.stage('tagging', rows=len(raw_df)):
+            descriptions = raw_df.get('description', pd.Series('', index=raw_df.index))
+            raw_df['segment_tag'] = self.fetcher.determine_segment_tags(raw_df['name'], descriptions)
+        return raw_df
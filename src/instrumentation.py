@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+from array import array
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+METRIC_PREFIX = 'lead_sniper'
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Metrics:
+    """Потокобезопасные метрики пайплайна: таймеры этапов, гистограммы задержек и счётчики.
+
+    Время этапов, выполняющихся в нескольких потоках (HTTP, ожидание лимита),
+    суммируется по всем потокам, поэтому может превышать общее время запуска.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = defaultdict(int)
+        self.stage_rows = defaultdict(int)
+        self.counters = defaultdict(int)
+        # Сырые значения хранятся компактно (8 байт на наблюдение) для точных перцентилей
+        self.samples = defaultdict(lambda: array('d'))
+
+    @contextmanager
+    def stage(self, name: str, rows: int = None):
+        """Контекстный менеджер: замеряет время этапа и (опционально) число обработанных строк."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(name, time.perf_counter() - started, rows)
+
+    def add_stage_time(self, name: str, seconds: float, rows: int = None):
+        """Добавляет время (и строки) к этапу."""
+        with self._lock:
+            self.stage_seconds[name] += seconds
+            self.stage_calls[name] += 1
+            if rows:
+                self.stage_rows[name] += rows
+
+    def observe(self, name: str, seconds: float):
+        """Добавляет наблюдение в гистограмму задержек."""
+        with self._lock:
+            self.samples[name].append(seconds)
+
+    def incr(self, name: str, value: int = 1):
+        """Увеличивает счётчик событий."""
+        with self._lock:
+            self.counters[name] += value
+
+    def report(self) -> dict:
+        """Собирает отчёт о запуске в виде словаря."""
+        with self._lock:
+            wall_seconds = time.perf_counter() - self._started
+            stages = {}
+            for name, seconds in self.stage_seconds.items():
+                rows = self.stage_rows.get(name, 0)
+                stages[name] = {
+                    'seconds': round(seconds, 6),
+                    'calls': self.stage_calls[name],
+                    'rows': rows,
+                    'rows_per_sec': round(rows / seconds, 2) if rows and seconds > 0 else None
+                }
+
+            latencies = {}
+            for name, values in self.samples.items():
+                if not values:
+                    continue
+                data = np.frombuffer(values, dtype=np.float64)
+                latencies[name] = {
+                    'count': len(data),
+                    'sum': round(float(data.sum()), 6),
+                    'mean': round(float(data.mean()), 6),
+                    'max': round(float(data.max()), 6),
+                    **{f"p{int(q * 100)}": round(float(np.quantile(data, q)), 6) for q in QUANTILES}
+                }
+
+            return {
+                'wall_seconds': round(wall_seconds, 3),
+                'stages': stages,
+                'latency_seconds': latencies,
+                'counters': dict(self.counters)
+            }
+
+    def write_json(self, path: str):
+        """Сохраняет отчёт о запуске в JSON."""
+        _ensure_directory(path)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Возвращает метрики в текстовом формате Prometheus."""
+        report = self.report()
+        lines = [
+            f"# TYPE {METRIC_PREFIX}_wall_seconds gauge",
+            f"{METRIC_PREFIX}_wall_seconds {report['wall_seconds']}",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds_total counter",
+        ]
+        for name, stage in report['stages'].items():
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_total{{stage="{name}"}} {stage["seconds"]}')
+        lines.append(f"# TYPE {METRIC_PREFIX}_stage_rows_total counter")
+        for name, stage in report['stages'].items():
+            lines.append(f'{METRIC_PREFIX}_stage_rows_total{{stage="{name}"}} {stage["rows"]}')
+
+        lines.append(f"# TYPE {METRIC_PREFIX}_latency_seconds summary")
+        for name, hist in report['latency_seconds'].items():
+            for q in QUANTILES:
+                lines.append(f'{METRIC_PREFIX}_latency_seconds{{name="{name}",quantile="{q}"}} '
+                             f'{hist[f"p{int(q * 100)}"]}')
+            lines.append(f'{METRIC_PREFIX}_latency_seconds_sum{{name="{name}"}} {hist["sum"]}')
+            lines.append(f'{METRIC_PREFIX}_latency_seconds_count{{name="{name}"}} {hist["count"]}')
+
+        lines.append(f"# TYPE {METRIC_PREFIX}_events_total counter")
+        for name, value in sorted(report['counters'].items()):
+            lines.append(f'{METRIC_PREFIX}_events_total{{name="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        """Сохраняет метрики в текстовом формате Prometheus (например, для node_exporter textfile)."""
+        _ensure_directory(path)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+
+
+def _ensure_directory(path: str):
+    """Создаёт каталог для файла, если его ещё нет."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
@@ -0,0 +1,57 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+class KeywordMatcher:
+    """Поиск ключевых слов по группам с помощью заранее скомпилированных регулярных выражений.
+
+    Выражения строятся один раз из таблицы {группа: [ключевые слова]} и применяются
+    к целым столбцам pandas за один векторный проход. Поиск регистронезависимый
+    и эквивалентен проверке `keyword in text.lower()` по каждому ключевому слову.
+    """
+
+    def __init__(self, keyword_groups: dict):
+        self.keyword_groups = {group: list(keywords) for group, keywords in keyword_groups.items()}
+        self.groups = sorted(self.keyword_groups)
+
+        all_keywords = [kw for keywords in self.keyword_groups.values() for kw in keywords]
+        self._group_patterns = {
+            group: self._build_pattern(keywords) for group, keywords in self.keyword_groups.items()
+        }
+        self._any_pattern = self._build_pattern(all_keywords)
+
+    @staticmethod
+    def _build_pattern(keywords) -> str:
+        """Собирает альтернацию из экранированных ключевых слов (длинные первыми)."""
+        unique = sorted({kw.lower() for kw in keywords if kw}, key=len, reverse=True)
+        return '|'.join(re.escape(kw) for kw in unique)
+
+    def group_masks(self, texts: pd.Series) -> pd.DataFrame:
+        """Для столбца текстов возвращает булеву таблицу «строка × группа»."""
+        lowered = texts.astype(str).str.lower()
+        masks = {}
+        for group in self.groups:
+            pattern = self._group_patterns[group]
+            if pattern:
+                masks[group] = lowered.str.contains(pattern, regex=True).fillna(False).astype(bool)
+            else:
+                masks[group] = pd.Series(False, index=texts.index)
+        return pd.DataFrame(masks, index=texts.index)
+
+    def contains_any_column(self, texts: pd.Series) -> pd.Series:
+        """Для столбца текстов возвращает булеву маску: есть ли в строке хотя бы одно ключевое слово."""
+        if not self._any_pattern:
+            return pd.Series(False, index=texts.index)
+        lowered = texts.astype(str).str.lower()
+        return lowered.str.contains(self._any_pattern, regex=True).fillna(False).astype(bool)
+
+    def tag_column(self, texts: pd.Series, default: str = '') -> pd.Series:
+        """Возвращает для каждой строки найденные группы через запятую в алфавитном порядке (default, если групп нет)."""
+        masks = self.group_masks(texts)
+        tags = pd.Series('', index=texts.index, dtype=object)
+        for group in self.groups:
+            tags = tags + np.where(masks[group].to_numpy(), group + ',', '')
+        tags = tags.str.rstrip(',')
+        return tags.mask(tags == '', default)
@@ -1,8 +1,22 @@
+import argparse
+import os
 import pandas as pd
 import logging
-import time
+from concurrent.futures import ProcessPoolExecutor
+from checkpoint import CheckpointJournal
 from data_fetcher import DataFetcher
 from data_processor import DataProcessor
+from enricher import Enricher
+from instrumentation import Metrics
+from name_dedup import dedup_seed_by_name, parse_threshold
+from pipeline import ChunkedPipeline, CsvChunkWriter, iter_seed_chunks
+from prefilter import CompanyIndex, PreFilter
+from rate_limiter import AdaptiveRateLimiter
+from records import RecordColumns
+from response_cache import ResponseCache
+from refresh import DEFAULT_REFRESH_FIELDS, FRESHNESS_POLICY, load_previous, merge_refreshed, parse_fields, plan_refresh
+from sharding import merge_shards, parse_shard, select_shard, shard_path
+from storage import OUTPUT_FORMATS, ParquetChunkWriter, save_dataset, upsert_dataset
 
 logging.basicConfig(
     level=logging.INFO, 
@@ -10,7 +24,329 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def main():
+# Параметры обогащения: число параллельных запросов и квота Checko API.
+# Частота стартует с CHECKO_REQUESTS_PER_SECOND и адаптивно растёт до CHECKO_MAX_REQUESTS_PER_SECOND,
+# пока API отвечает без 429/5xx
+MAX_WORKERS = 8
+CHECKO_REQUESTS_PER_SECOND = 5
+CHECKO_MAX_REQUESTS_PER_SECOND = 10
+CHECKO_BURST = 5
+CHECKO_MAX_RETRIES = 4
+
+# Постоянный кэш ответов Checko: время жизни записи и максимальный размер
+CACHE_PATH = "../data/checko_cache.sqlite"
+CACHE_TTL_SECONDS = 24 * 3600
+CACHE_MAX_ENTRIES = 200_000
+
+# Журнал контрольных точек обогащения для режима --resume
+JOURNAL_PATH = "../data/enrichment_journal.jsonl"
+
+# Файл результатов (расширение зависит от --format) и размер части seed-списка в потоковом режиме
+OUTPUT_PATH = "../data/companies"
+CHUNK_SIZE = 1000
+
+# Индекс ИНН → ОКВЭД/выручка по прошлым запускам: по нему предфильтр отсеивает компании до запроса к API
+INDEX_PATH = "../data/company_index.sqlite"
+
+# Порог сходства названий (коэффициент Жаккара по триграммам) для объединения дублей из разных seed-источников
+NAME_DEDUP_THRESHOLD = 0.8
+
+# Отчёт о запуске: время этапов, перцентили задержек запросов, источники данных
+REPORT_PATH = "../data/run_report.json"
+RATING_URL = "https://www.sostav.ru/ratings/agency/"
+
+def parse_args(argv=None):
+    """Разбирает параметры командной строки."""
+    parser = argparse.ArgumentParser(description="Сбор базы BTL и маркетинговых агентств")
+    parser.add_argument('--resume', action='store_true',
+                        help="продолжить прерванный запуск: пропустить ИНН, уже сохранённые в журнале")
+    parser.add_argument('--journal', default=JOURNAL_PATH,
+                        help=f"путь к журналу контрольных точек (по умолчанию {JOURNAL_PATH})")
+    parser.add_argument('--stream', action='store_true',
+                        help="потоковый режим: обрабатывать seed-список частями и дописывать результат по мере готовности")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"размер части seed-списка в потоковом режиме (по умолчанию {CHUNK_SIZE})")
+    parser.add_argument('--seed-file', nargs='+',
+                        help="CSV с seed-списком (столбцы inn, name и необязательный rating_ref) вместо рейтинга; "
+                             "несколько файлов объединяются")
+    parser.add_argument('--output',
+                        help=f"путь к файлу результатов (по умолчанию {OUTPUT_PATH}.<формат>)")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv',
+                        help="формат файла результатов: csv, parquet или feather (по умолчанию csv)")
+    parser.add_argument('--upsert', action='store_true',
+                        help="объединить результат с уже сохранённым файлом по ИНН вместо перезаписи")
+    parser.add_argument('--report', default=REPORT_PATH,
+                        help=f"путь к JSON-отчёту о времени этапов и задержках (по умолчанию {REPORT_PATH})")
+    parser.add_argument('--prometheus',
+                        help="дополнительно сохранить метрики в текстовом формате Prometheus по этому пути")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="разбить seed-список по хэшу ИНН на N шардов и обработать их в N процессах")
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+                        help="обработать только шард I из N (например, на отдельной машине с общим --seed-file); "
+                             "результат пишется в файл шарда")
+    parser.add_argument('--merge-only', action='store_true',
+                        help="не запускать шарды, только объединить готовые файлы шардов (вместе с --shards N)")
+    parser.add_argument('--refresh', action='store_true',
+                        help="инкрементальное обновление: запросить только новые ИНН и ИНН с устаревшими данными "
+                             "и объединить их с прежним результатом --output")
+    parser.add_argument('--refresh-fields', type=parse_fields, default=list(DEFAULT_REFRESH_FIELDS),
+                        help="поля, свежесть которых проверяется при --refresh, через запятую (по умолчанию "
+                             f"{','.join(DEFAULT_REFRESH_FIELDS)}); запись устаревает по самому короткому сроку "
+                             "среди выбранных: "
+                             + ', '.join(f"{field} {days} дн." for field, days in FRESHNESS_POLICY.items()))
+    parser.add_argument('--index', default=INDEX_PATH,
+                        help=f"индекс компаний из прошлых запусков для предфильтра (по умолчанию {INDEX_PATH})")
+    parser.add_argument('--no-prefilter', action='store_true',
+                        help="запрашивать все ИНН, даже если по индексу они заведомо не проходят фильтр")
+    parser.add_argument('--name-threshold', type=parse_threshold, default=NAME_DEDUP_THRESHOLD,
+                        help="порог сходства названий для объединения дублей seed-списка (кроме потокового режима), "
+                             "от 0 до 1 "
+                             f"(по умолчанию {NAME_DEDUP_THRESHOLD})")
+    parser.add_argument('--no-name-dedup', action='store_true',
+                        help="не объединять компании с похожими названиями (дедупликация только по ИНН)")
+    args = parser.parse_args(argv)
+
+    if args.refresh and (args.stream or args.upsert or args.shards > 1 or args.shard is not None):
+        parser.error("--refresh несовместим с --stream, --upsert и шардированным режимом")
+    if args.stream and (args.shards > 1 or args.shard is not None):
+        parser.error("шардированный режим несовместим с --stream")
+    if args.shard is not None and args.shards > 1:
+        parser.error("укажите либо --shards N, либо --shard I/N")
+    if args.shard is not None and not args.seed_file:
+        # Рейтинг, загруженный на разных машинах, может отличаться порядком строк и составом
+        parser.error("--shard I/N требует общий --seed-file: шарды должны делить один и тот же seed-список")
+    if args.merge_only and args.shards < 2:
+        parser.error("--merge-only требует --shards N (N > 1)")
+    if args.stream and args.upsert:
+        parser.error("--upsert несовместим с --stream")
+    if args.stream and args.format == 'feather':
+        parser.error("потоковый режим поддерживает только форматы csv и parquet")
+    if args.output is None:
+        args.output = f"{OUTPUT_PATH}.{args.format}"
+    return args
+
+def write_run_report(args, metrics, fetcher=None):
+    """Сохраняет отчёт о запуске (JSON и, по запросу, Prometheus) и выводит сводку по этапам в лог."""
+    if fetcher is not None:
+        metrics.incr('cache_evictions', fetcher.cache.stats()['evictions'])
+        metrics.incr('rate_limiter_throttled', fetcher.rate_limiter.stats()['throttled'])
+
+    report = metrics.report()
+    for name, stage in report['stages'].items():
+        throughput = f", {stage['rows_per_sec']:.1f} строк/сек" if stage['rows_per_sec'] else ""
+        logger.info(f"Этап {name}: {stage['seconds']:.3f} с{throughput}")
+    http = report['latency_seconds'].get('http_request')
+    if http:
+        logger.info(f"Задержка HTTP: p50 {http['p50'] * 1000:.0f} мс, p95 {http['p95'] * 1000:.0f} мс, "
+                    f"p99 {http['p99'] * 1000:.0f} мс ({http['count']} запросов)")
+
+    try:
+        metrics.write_json(args.report)
+        logger.info(f"Отчёт о запуске сохранён: {args.report}")
+        if args.prometheus:
+            metrics.write_prometheus(args.prometheus)
+            logger.info(f"Метрики Prometheus сохранены: {args.prometheus}")
+    except OSError as e:
+        logger.error(f"Не удалось сохранить отчёт о запуске: {e}")
+
+def run_streaming(args, fetcher, processor, journal, seed_source, metrics):
+    """Потоковый режим: seed-список обрабатывается частями, результат дописывается в файл."""
+    if args.format == 'parquet':
+        writer = ParquetChunkWriter(args.output, append=args.resume)
+    else:
+        writer = CsvChunkWriter(args.output, append=args.resume)
+    enricher = Enricher(fetcher, max_workers=MAX_WORKERS, journal=journal, metrics=metrics)
+    index = CompanyIndex(args.index)
+    prefilter = None if args.no_prefilter else PreFilter(index, processor)
+    pipeline = ChunkedPipeline(enricher, processor, writer, chunk_size=args.chunk_size, metrics=metrics,
+                               prefilter=prefilter, index=index)
+
+    if args.resume:
+        for inns in writer.existing_inns():
+            pipeline.mark_seen(inns)
+
+        # Записи журнала, не попавшие в результат до сбоя, обрабатываются без повторных запросов к API
+        batch = []
+        for record in journal.iter_records():
+            batch.append(record)
+            if len(batch) >= args.chunk_size:
+                pipeline.process_records(batch)
+                batch = []
+        pipeline.process_records(batch)
+        logger.info(f"Возобновление: из журнала восстановлено {pipeline.stats['enriched']} записей, "
+                    f"дописано в файл результатов {writer.rows_written}")
+    else:
+        journal.reset()
+
+    try:
+        stats = pipeline.run(iter_seed_chunks(seed_source, args.chunk_size))
+    finally:
+        journal.close()
+        index.close()
+
+    print(f"\n{'='*60}")
+    print("🎉 ПОТОКОВЫЙ СБОР ДАННЫХ ЗАВЕРШЕН!")
+    print(f"{'='*60}\n")
+    print(f"📁 Файл с результатами: {args.output}")
+    print(f"📦 Обработано частей: {stats['chunks']}, строк seed-списка: {stats['seed_rows']}")
+    print(f"🌐 Обогащено записей: {stats['enriched']}, пропущено повторных ИНН: "
+          f"{stats['skipped_seen'] + stats['duplicates']}")
+    if prefilter is not None:
+        print(f"✂️  Отсеяно предфильтром без запроса к API: {prefilter.stats['skipped']} ИНН")
+    print(f"📈 Записано компаний: {stats['written']}")
+    print(f"{'='*60}")
+
+def create_fetcher(api_key: str, demo_mode: bool, metrics, quota_share: float = 1.0) -> DataFetcher:
+    """Создаёт DataFetcher с кэшем ответов и ограничителем частоты на долю quota_share от квоты API."""
+    rate_limiter = AdaptiveRateLimiter(
+        CHECKO_REQUESTS_PER_SECOND * quota_share, burst=max(1, round(CHECKO_BURST * quota_share)),
+        max_rate=CHECKO_MAX_REQUESTS_PER_SECOND * quota_share, max_concurrency=MAX_WORKERS
+    )
+    cache = ResponseCache(CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES)
+    return DataFetcher(
+        api_key, rate_limiter=rate_limiter, pool_size=MAX_WORKERS, cache=cache,
+        max_retries=0 if demo_mode else CHECKO_MAX_RETRIES, mock_on_failure=demo_mode, metrics=metrics
+    )
+
+def load_seed_companies(args, fetcher) -> pd.DataFrame:
+    """Загружает seed-список из --seed-file или из отраслевого рейтинга."""
+    if args.seed_file:
+        return pd.concat(iter_seed_chunks(args.seed_file, 100_000), ignore_index=True)
+    return fetcher.parse_industry_rating(RATING_URL)
+
+def dedup_seed_names(args, seed_companies: pd.DataFrame, metrics) -> pd.DataFrame:
+    """Объединяет строки seed-списка с похожими названиями (одна компания из разных источников)."""
+    if args.no_name_dedup:
+        return seed_companies
+
+    with metrics.stage('name_dedup', rows=len(seed_companies)):
+        seed_companies, stats = dedup_seed_by_name(seed_companies, args.name_threshold)
+    metrics.incr('name_dedup_removed', stats['removed'])
+    logger.info(f"Дедупликация по названиям (порог {args.name_threshold}): объединено групп {stats['clusters']}, "
+                f"убрано строк {stats['removed']} из {stats['rows']}")
+    return seed_companies
+
+def prefilter_seed(args, index, processor, seed_companies: pd.DataFrame, metrics) -> pd.DataFrame:
+    """Убирает из seed-списка ИНН, которые по данным прошлых запусков заведомо не пройдут фильтр."""
+    if args.no_prefilter:
+        return seed_companies
+
+    with metrics.stage('prefilter', rows=len(seed_companies)):
+        seed_companies, stats = PreFilter(index, processor).apply(seed_companies)
+    metrics.incr('prefilter_skipped', stats['skipped'])
+    logger.info(f"Предфильтр: в индексе есть свежие данные по {stats['known']} из {stats['checked']} ИНН, "
+                f"сэкономлено запросов к API: {stats['skipped']}")
+    return seed_companies
+
+def enrich_companies(args, fetcher, journal, seed_companies: pd.DataFrame, metrics) -> pd.DataFrame:
+    """Обогащает seed-список через API и возвращает сырые записи с тегами сегментов.
+
+    При --resume записи, уже сохранённые в журнале, не запрашиваются.
+    """
+    enriched_data = RecordColumns()
+
+    if args.resume:
+        completed_inns = set()
+        for record in journal.iter_records():
+            enriched_data.append(record)
+            completed_inns.add(str(record.get('inn', '')).strip())
+        pending = ~seed_companies['inn'].astype(str).str.strip().isin(completed_inns)
+        logger.info(f"Возобновление: в журнале {len(enriched_data)} записей, "
+                    f"осталось обработать {pending.sum()} из {len(seed_companies)}")
+        seed_companies = seed_companies[pending]
+    else:
+        journal.reset()
+
+    enricher = Enricher(fetcher, max_workers=MAX_WORKERS, journal=journal, metrics=metrics)
+    try:
+        new_data = enricher.enrich(seed_companies)
+        if enriched_data:
+            enriched_data.extend(new_data)
+        else:
+            enriched_data = new_data
+    finally:
+        journal.close()
+
+    cache_stats = fetcher.cache.stats()
+    logger.info(f"Кэш Checko: попаданий {cache_stats['hits']}, промахов {cache_stats['misses']} "
+                f"({cache_stats['hit_rate']:.0%}), записей в кэше {cache_stats['size']}")
+    limiter_stats = fetcher.rate_limiter.stats()
+    logger.info(f"Ограничитель API: итоговая частота {limiter_stats['rate']:.1f} запр/сек, "
+                f"параллельность {limiter_stats['concurrency']}, ответов 429/503 {limiter_stats['throttled']}, "
+                f"сетевых ошибок {limiter_stats['errors']}")
+    return enricher.tag_segments(enriched_data.to_frame())
+
+def run_shard(args, api_key: str, demo_mode: bool, shard: int, num_shards: int,
+              seed_companies: pd.DataFrame = None) -> dict:
+    """Обрабатывает один шард: выборка ИНН шарда → обогащение → теги → нормализация → файл шарда.
+
+    seed_companies — уже выбранные строки шарда; без них (--shard I/N) шард сам читает
+    --seed-file, объединяет дубли по названиям и выбирает свои ИНН.
+    Шард получает 1/num_shards квоты API, свой журнал и свой отчёт о запуске;
+    фильтрация выполняется при объединении шардов.
+    """
+    metrics = Metrics()
+    fetcher = create_fetcher(api_key, demo_mode, metrics, quota_share=1 / num_shards)
+    processor = DataProcessor()
+
+    if seed_companies is None:
+        # Дубли по названиям ищутся по всему seed-списку, до деления на шарды
+        seed_companies = dedup_seed_names(args, load_seed_companies(args, fetcher), metrics)
+        seed_companies = select_shard(seed_companies, shard, num_shards)
+    logger.info(f"Шард {shard + 1}/{num_shards}: {len(seed_companies)} компаний")
+
+    # Индекс общий для всех шардов (SQLite с ожиданием блокировки), как и кэш ответов
+    index = CompanyIndex(args.index)
+    seed_companies = prefilter_seed(args, index, processor, seed_companies, metrics)
+
+    journal = CheckpointJournal(shard_path(args.journal, shard, num_shards))
+    raw_df = enrich_companies(args, fetcher, journal, seed_companies, metrics)
+    with metrics.stage('normalize', rows=len(raw_df)):
+        clean_df = processor.normalize_data(raw_df)
+    index.update(clean_df)
+    index.close()
+
+    output_path = shard_path(args.output, shard, num_shards)
+    with metrics.stage('write', rows=len(clean_df)):
+        save_dataset(clean_df, output_path, args.format)
+    logger.info(f"Шард {shard + 1}/{num_shards} сохранён: {output_path} ({len(clean_df)} записей)")
+
+    shard_args = argparse.Namespace(**vars(args))
+    shard_args.report = shard_path(args.report, shard, num_shards)
+    if args.prometheus:
+        shard_args.prometheus = shard_path(args.prometheus, shard, num_shards)
+    write_run_report(shard_args, metrics, fetcher)
+    return {'shard': shard, 'seed_rows': len(seed_companies), 'records': len(clean_df), 'path': output_path}
+
+def run_sharded(args, api_key: str, demo_mode: bool, processor, metrics) -> pd.DataFrame:
+    """Запускает шарды в отдельных процессах (если не --merge-only) и объединяет их результаты."""
+    num_shards = args.shards
+    if not args.merge_only:
+        logger.info(f"\n🧩 Шардированный режим: шардов {num_shards}, квота API делится поровну")
+        # Seed-список загружается и очищается от дублей один раз: рейтинг не запрашивается в каждом
+        # процессе, и все шарды делят один и тот же набор строк
+        seed_companies = load_seed_companies(args, create_fetcher(api_key, demo_mode, metrics))
+        seed_companies = dedup_seed_names(args, seed_companies, metrics)
+        with metrics.stage('shards'):
+            with ProcessPoolExecutor(max_workers=num_shards) as pool:
+                futures = [pool.submit(run_shard, args, api_key, demo_mode, shard, num_shards,
+                                       select_shard(seed_companies, shard, num_shards))
+                           for shard in range(num_shards)]
+                for future in futures:
+                    result = future.result()
+                    logger.info(f"Шард {result['shard'] + 1}/{num_shards}: seed {result['seed_rows']}, "
+                                f"записей {result['records']}")
+
+    logger.info("\n🔗 Объединение шардов...")
+    paths = [shard_path(args.output, shard, num_shards) for shard in range(num_shards)]
+    with metrics.stage('merge'):
+        final_df = merge_shards(paths, processor, args.format)
+    logger.info(f"После объединения и фильтрации: {len(final_df)} записей")
+    return final_df
+
+def main(argv=None):
+    args = parse_args(argv)
+
     # 1. Инициализация
     logger.info("=" * 60)
     logger.info("ЗАПУСК СБОРА ДАННЫХ О BTL АГЕНТСТВАХ")
@@ -19,84 +355,124 @@ def main():
     # ВАЖНО: Получите новый ключ на checko.ru и замените этот!
     CHECKO_API_KEY = "YnFR1HbSIXBUnk6b"
     
-    if CHECKO_API_KEY == "YnFR1HbSIXBUnk6b":
+    demo_mode = CHECKO_API_KEY == "YnFR1HbSIXBUnk6b"
+    if demo_mode:
         logger.warning("API ключ не установлен! Будут использованы тестовые данные.")
-    
-    fetcher = DataFetcher(CHECKO_API_KEY)
-    processor = DataProcessor()
 
-    # 2. Получение "семенного" списка компаний
-    logger.info("\n🔍 Этап 1: Получение списка компаний...")
-    seed_companies = fetcher.parse_industry_rating("https://www.sostav.ru/ratings/agency/")
-    
-    if seed_companies.empty:
-        logger.error("Не удалось получить seed-список. Завершение работы.")
+    if args.shard is not None:
+        # Один шард на этой машине: результат остаётся в файле шарда до объединения через --merge-only
+        run_shard(args, CHECKO_API_KEY, demo_mode, *args.shard)
         return
-    
-    logger.info(f"Получено {len(seed_companies)} компаний для обработки")
-    logger.info(f"Примеры: {seed_companies['name'].head(3).tolist()}")
 
-    # 3. Обогащение данных через API
-    logger.info("\n🌐 Этап 2: Запрос данных через API...")
-    enriched_data = []
-    
-    # В цикле обогащения данных:
-    for idx, row in seed_companies.iterrows():
-        company_inn = row['inn']
-        company_name = row['name']  # Берём оригинальное название из seed-списка
-    
-        logger.info(f"[{idx+1}/{len(seed_companies)}] Запрашиваем данные для: {company_name} (ИНН: {company_inn})")
-    
-        # Передаём ОБА параметра: ИНН и оригинальное название
-        company_info = fetcher.fetch_company_via_api_by_inn(company_inn, company_name)
-    
-        if company_info:
-            # Определяем теги сегмента
-            company_info['segment_tag'] = fetcher.determine_segment_tag(
-                company_info['name'], 
-                company_info.get('description', '')
-            )
-            company_info['rating_ref'] = row['rating_ref']
-            enriched_data.append(company_info)
-        
-            logger.info(f"  ✓ Получено: {company_info['name']} - Выручка: {company_info['revenue']:.1f} млн руб")
-        else:
-            logger.warning(f"  ✗ Не удалось получить данные для {company_name}")
-    
-        # Пауза между запросами
-        if idx < len(seed_companies) - 1:
-            time.sleep(1.5)
+    metrics = Metrics()
+    processor = DataProcessor()
+    fetcher = None
 
-    # 4. Обработка и фильтрация
-    logger.info("\n🔄 Этап 3: Обработка данных...")
-    
-    if not enriched_data:
-        logger.error("Не удалось получить данные ни по одной компании. Завершение работы.")
-        return
-    
-    raw_df = pd.DataFrame(enriched_data)
-    logger.info(f"Собрано сырых данных: {len(raw_df)} записей")
-    
-    clean_df = processor.normalize_data(raw_df)
-    logger.info(f"После нормализации: {len(clean_df)} записей")
-    
-    final_df = processor.filter_companies(clean_df)
-    logger.info(f"После фильтрации: {len(final_df)} записей")
+    if args.shards > 1:
+        final_df = run_sharded(args, CHECKO_API_KEY, demo_mode, processor, metrics)
+        if final_df.empty:
+            logger.error("Шарды не содержат данных. Завершение работы.")
+            return
+    else:
+        fetcher = create_fetcher(CHECKO_API_KEY, demo_mode, metrics)
+        journal = CheckpointJournal(args.journal)
+
+        if args.stream:
+            logger.info(f"\n🌊 Потоковый режим: части по {args.chunk_size} компаний")
+            seed_source = args.seed_file or fetcher.iter_industry_rating(RATING_URL)
+            run_streaming(args, fetcher, processor, journal, seed_source, metrics)
+            write_run_report(args, metrics, fetcher)
+            return
+
+        # 2. Получение "семенного" списка компаний
+        logger.info("\n🔍 Этап 1: Получение списка компаний...")
+        seed_companies = load_seed_companies(args, fetcher)
+
+        if seed_companies.empty:
+            logger.error("Не удалось получить seed-список. Завершение работы.")
+            return
+
+        logger.info(f"Получено {len(seed_companies)} компаний для обработки")
+        logger.info(f"Примеры: {seed_companies['name'].head(3).tolist()}")
+        seed_companies = dedup_seed_names(args, seed_companies, metrics)
+
+        if args.refresh:
+            previous_df = load_previous(args.output, args.format)
+            seed_companies, refresh_stats = plan_refresh(seed_companies, previous_df, args.refresh_fields)
+            logger.info(f"Инкрементальное обновление: новых ИНН {refresh_stats['new']}, "
+                        f"устаревших {refresh_stats['stale']}, актуальных {refresh_stats['fresh']} "
+                        f"(поля: {', '.join(args.refresh_fields)})")
+            metrics.incr('refresh_skipped_fresh', refresh_stats['fresh'])
+            if seed_companies.empty:
+                logger.info("Все данные актуальны, запросы к API не требуются.")
+                write_run_report(args, metrics, fetcher)
+                return
+
+        index = CompanyIndex(args.index)
+        seed_companies = prefilter_seed(args, index, processor, seed_companies, metrics)
+        if seed_companies.empty and not args.resume:
+            logger.info("Все компании заведомо не проходят фильтр, запросы к API не требуются.")
+            index.close()
+            write_run_report(args, metrics, fetcher)
+            return
+
+        # 3. Обогащение данных через API
+        logger.info("\n🌐 Этап 2: Запрос данных через API...")
+        logger.info(f"Параллельных запросов: до {MAX_WORKERS}, лимит API: "
+                    f"{CHECKO_REQUESTS_PER_SECOND}–{CHECKO_MAX_REQUESTS_PER_SECOND} запр/сек")
+        raw_df = enrich_companies(args, fetcher, journal, seed_companies, metrics)
+
+        # 4. Обработка и фильтрация
+        logger.info("\n🔄 Этап 3: Обработка данных...")
+
+        if raw_df.empty:
+            logger.error("Не удалось получить данные ни по одной компании. Завершение работы.")
+            return
+
+        logger.info(f"Собрано сырых данных: {len(raw_df)} записей")
+
+        with metrics.stage('normalize', rows=len(raw_df)):
+            clean_df = processor.normalize_data(raw_df)
+        logger.info(f"После нормализации: {len(clean_df)} записей")
+
+        # В индекс попадают и компании, которые не пройдут фильтр: именно их предфильтр отсеет в следующий раз
+        index.update(clean_df)
+        index.close()
+
+        with metrics.stage('filter', rows=len(clean_df)):
+            final_df = processor.filter_companies(clean_df)
+        logger.info(f"После фильтрации: {len(final_df)} записей")
+
+        if args.refresh:
+            # Заменяются только записи, по которым API ответил: при сбое запроса остаются прежние данные
+            final_df = merge_refreshed(previous_df, final_df, clean_df['inn'])
+            logger.info(f"После объединения с прежним результатом: {len(final_df)} записей")
     
     # 5. Сохранение результата
     logger.info("\n💾 Этап 4: Сохранение результатов...")
-    output_path = "../data/companies.csv"
+    output_path = args.output
+    dataset_size = len(final_df)
     
     try:
-        final_df.to_csv(output_path, index=False, encoding='utf-8-sig')
+        with metrics.stage('write', rows=len(final_df)):
+            if args.upsert:
+                upsert_stats = upsert_dataset(final_df, output_path, args.format)
+                logger.info(f"Обновление по ИНН: добавлено {upsert_stats['inserted']}, "
+                            f"изменено {upsert_stats['updated']}, без изменений {upsert_stats['unchanged']}, "
+                            f"всего в базе {upsert_stats['total']}")
+                dataset_size = upsert_stats['total']
+            else:
+                save_dataset(final_df, output_path, args.format)
         logger.info(f"✅ Файл успешно сохранен: {output_path}")
     except Exception as e:
         logger.error(f"Ошибка при сохранении файла: {e}")
         # Пробуем альтернативный путь
-        output_path = "companies.csv"
-        final_df.to_csv(output_path, index=False, encoding='utf-8-sig')
+        output_path = os.path.basename(output_path)
+        save_dataset(final_df, output_path, args.format)
         logger.info(f"Файл сохранен по альтернативному пути: {output_path}")
 
+    write_run_report(args, metrics, fetcher)
+
     # 6. Вывод статистики
     logger.info("\n📊 ИТОГОВАЯ СТАТИСТИКА:")
     logger.info("=" * 40)
@@ -107,7 +483,7 @@ def main():
         print(f"{'='*60}\n")
         
         print(f"📁 Файл с результатами: {output_path}")
-        print(f"📈 Всего компаний в базе: {len(final_df)}")
+        print(f"📈 Всего компаний в базе: {dataset_size}")
         print(f"💰 Средняя выручка: {final_df['revenue'].mean():.1f} млн руб")
         print(f"📊 Диапазон выручки: от {final_df['revenue'].min():.1f} до {final_df['revenue'].max():.1f} млн руб")
         
@@ -0,0 +1,252 @@
+import argparse
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Организационно-правовые формы и общие слова, не отличающие одно агентство от другого
+NAME_STOP_WORDS = frozenset({
+    'ооо', 'оао', 'зао', 'пао', 'ао', 'ип', 'ано', 'нко', 'llc', 'ltd', 'inc',
+    'гк', 'группа', 'компаний', 'компания', 'group', 'company', 'агентство', 'agency',
+    'холдинг', 'holding', 'btl', 'atl',
+})
+NON_ALNUM_PATTERN = re.compile(r'[^0-9a-zа-я]+')
+
+# MinHash: 64 хэш-функции multiply-shift ((a * x + b) mod 2^64) >> 32 над номерами триграмм
+NUM_PERM = 64
+_SHIFT = np.uint64(32)
+# Ограничение числа триграмм в одной пачке: матрица NUM_PERM × триграммы занимает ~32 МБ
+_BATCH_SHINGLES = 65_536
+# Кандидаты с оценкой сходства по сигнатурам ниже порога больше чем на ~3σ (64 хэша) не проверяются точно
+_ESTIMATE_MARGIN = 0.15
+_BATCH_PAIRS = 262_144
+
+INN_WEIGHTS_10 = (2, 4, 10, 3, 5, 9, 4, 6, 8)
+INN_WEIGHTS_11 = (7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+INN_WEIGHTS_12 = (3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+
+
+def parse_threshold(value: str) -> float:
+    """Разбирает порог сходства названий (доля от 0 до 1)."""
+    try:
+        threshold = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается число от 0 до 1, получено «{value}»")
+    if not 0 < threshold <= 1:
+        raise argparse.ArgumentTypeError("порог сходства должен быть больше 0 и не больше 1")
+    return threshold
+
+
+def normalize_company_name(name) -> str:
+    """Название без регистра, кавычек, знаков препинания, ОПФ и общих слов («ООО "Эверест BTL"» → «эверест»).
+
+    Если после удаления общих слов ничего не осталось («BTL Group»), они сохраняются.
+    """
+    words = NON_ALNUM_PATTERN.sub(' ', str(name).lower().replace('ё', 'е')).split()
+    core = [word for word in words if word not in NAME_STOP_WORDS]
+    return ' '.join(core or words)
+
+
+def is_valid_inn(inn) -> bool:
+    """Проверяет ИНН: 10 или 12 цифр с верными контрольными разрядами."""
+    inn = str(inn).strip()
+    if not inn.isdigit() or len(inn) not in (10, 12):
+        return False
+    digits = [int(c) for c in inn]
+
+    def check(weights):
+        return sum(w * d for w, d in zip(weights, digits)) % 11 % 10
+
+    if len(digits) == 10:
+        return check(INN_WEIGHTS_10) == digits[9]
+    return check(INN_WEIGHTS_11) == digits[10] and check(INN_WEIGHTS_12) == digits[11]
+
+
+def name_shingles(name: str) -> set:
+    """Множество символьных триграмм нормализованного названия (с пробелами по краям)."""
+    padded = f" {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def jaccard(a: set, b: set) -> float:
+    """Коэффициент Жаккара двух множеств."""
+    if not a or not b:
+        return 0.0
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection)
+
+
+class _ClusterSet:
+    """Система непересекающихся множеств, в которой кластер содержит не больше одного корректного ИНН.
+
+    Разные корректные ИНН — разные юридические лица, даже при похожих названиях,
+    поэтому их кластеры не объединяются.
+    """
+
+    def __init__(self, inns: list):
+        self.parent = list(range(len(inns)))
+        self.inn = list(inns)
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i: int, j: int) -> bool:
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return True
+        if self.inn[ri] and self.inn[rj] and self.inn[ri] != self.inn[rj]:
+            return False
+        if rj < ri:
+            ri, rj = rj, ri
+        self.parent[rj] = ri
+        self.inn[ri] = self.inn[ri] or self.inn[rj]
+        return True
+
+
+class NameDedupIndex:
+    """MinHash/LSH-индекс по триграммам нормализованных названий для поиска дублей за почти линейное время.
+
+    Сигнатуры MinHash делятся на полосы; названия с совпадающей полосой становятся
+    кандидатами, и только для них считается точный коэффициент Жаккара. Число строк
+    в полосе подбирается так, чтобы пара с сходством, равным порогу, стала кандидатом
+    с вероятностью не ниже 99%.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = NUM_PERM, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        rng = np.random.default_rng(seed)
+        # Нечётные множители: переполнение uint64 — это и есть взятие по модулю 2^64
+        self._a = rng.integers(0, 2**63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        self.rows_per_band = self._choose_rows(threshold, num_perm)
+        self.stats = {'names': 0, 'candidates': 0, 'merged': 0, 'conflicts': 0}
+
+    @staticmethod
+    def _choose_rows(threshold: float, num_perm: int) -> int:
+        """Наибольшее число строк в полосе, при котором P(кандидат | сходство = порог) >= 0.99."""
+        best = 1
+        for rows in range(1, num_perm + 1):
+            if num_perm % rows:
+                continue
+            bands = num_perm // rows
+            if 1 - (1 - threshold ** rows) ** bands >= 0.99:
+                best = rows
+        return best
+
+    def signatures(self, shingle_sets: list) -> np.ndarray:
+        """Матрица MinHash-сигнатур (число названий × num_perm); множества не должны быть пустыми.
+
+        Триграммы нумеруются словарём в порядке появления: сигнатуры (а с ними и выбор
+        строк при дедупликации) воспроизводимы только при одинаковом порядке строк.
+        """
+        vocabulary = {}
+        ids = [vocabulary.setdefault(shingle, len(vocabulary)) for shingles in shingle_sets for shingle in shingles]
+        values = np.asarray(ids, dtype=np.uint64)
+        offsets = np.cumsum([0] + [len(shingles) for shingles in shingle_sets[:-1]], dtype=np.int64)
+
+        result = np.empty((len(shingle_sets), self.num_perm), dtype=np.uint64)
+        start = 0
+        while start < len(shingle_sets):
+            # Пачка названий, в которой не больше _BATCH_SHINGLES триграмм (но хотя бы одно название)
+            end = max(start + 1, int(np.searchsorted(offsets, offsets[start] + _BATCH_SHINGLES, side='right')))
+            low = offsets[start]
+            high = offsets[end] if end < len(shingle_sets) else len(values)
+            permuted = (self._a[:, None] * values[None, low:high] + self._b[:, None]) >> _SHIFT
+            result[start:end] = np.minimum.reduceat(permuted, offsets[start:end] - low, axis=1).T
+            start = end
+        return result
+
+    def clusters(self, names: pd.Series, inns: pd.Series) -> np.ndarray:
+        """Номер кластера (позиция первой строки кластера) для каждой строки.
+
+        Строки с одинаковым корректным ИНН попадают в один кластер; похожие названия
+        объединяются, если в кластере не оказывается двух разных корректных ИНН.
+        """
+        normalized = [normalize_company_name(name) for name in names.fillna('')]
+        valid_inns = [inn if is_valid_inn(inn) else '' for inn in inns.fillna('').astype(str).str.strip()]
+        clusters = _ClusterSet(valid_inns)
+
+        first_by_inn = {}
+        for pos, inn in enumerate(valid_inns):
+            if inn:
+                clusters.union(first_by_inn.setdefault(inn, pos), pos)
+
+        positions = [pos for pos, name in enumerate(normalized) if name]
+        shingles = [name_shingles(normalized[pos]) for pos in positions]
+        self.stats['names'] += len(positions)
+
+        pairs = self._candidate_pairs(self.signatures(shingles)) if positions else ()
+        for i, j in pairs:
+            if jaccard(shingles[i], shingles[j]) < self.threshold:
+                continue
+            if clusters.union(positions[i], positions[j]):
+                self.stats['merged'] += 1
+            else:
+                self.stats['conflicts'] += 1
+
+        return np.array([clusters.find(pos) for pos in range(len(normalized))], dtype=np.int64)
+
+    def _candidate_pairs(self, signatures: np.ndarray) -> list:
+        """Пары (i, j), у которых совпала хотя бы одна полоса сигнатуры, а оценка сходства близка к порогу.
+
+        В каждой корзине строки сравниваются только с её первой строкой — это держит
+        число пар линейным даже для больших корзин; остальные связи дают другие полосы.
+        """
+        size = len(signatures)
+        pair_keys = []
+        for start in range(0, self.num_perm, self.rows_per_band):
+            band = np.ascontiguousarray(signatures[:, start:start + self.rows_per_band])
+            keys = band.view(np.dtype((np.void, band.dtype.itemsize * band.shape[1]))).ravel()
+            _, first, bucket = np.unique(keys, return_index=True, return_inverse=True)
+            leaders = first[bucket]
+            members = np.flatnonzero(leaders != np.arange(size))
+            pair_keys.append(leaders[members] * size + members)
+
+        pair_keys = np.unique(np.concatenate(pair_keys))
+        self.stats['candidates'] += len(pair_keys)
+        left, right = pair_keys // size, pair_keys % size
+
+        # Доля совпавших хэшей — несмещённая оценка коэффициента Жаккара
+        keep = np.empty(len(pair_keys), dtype=bool)
+        for start in range(0, len(pair_keys), _BATCH_PAIRS):
+            batch = slice(start, start + _BATCH_PAIRS)
+            estimate = (signatures[left[batch]] == signatures[right[batch]]).mean(axis=1)
+            keep[batch] = estimate >= self.threshold - _ESTIMATE_MARGIN
+        return list(zip(left[keep].tolist(), right[keep].tolist()))
+
+def dedup_seed_by_name(seed_companies: pd.DataFrame, threshold: float = 0.8) -> tuple:
+    """Схлопывает в seed-списке строки одной компании под разными вариантами названия.
+
+    Из каждого кластера остаётся первая строка с корректным ИНН (или просто первая,
+    если корректного ИНН нет ни у одной). Возвращает (seed-список, статистика).
+    """
+    if seed_companies.empty:
+        return seed_companies, {'rows': 0, 'removed': 0, 'clusters': 0, 'conflicts': 0}
+
+    index = NameDedupIndex(threshold)
+    cluster_ids = index.clusters(seed_companies['name'], seed_companies['inn'])
+    has_valid_inn = seed_companies['inn'].map(is_valid_inn).to_numpy()
+
+    # Внутри кластера предпочитаем строки с корректным ИНН, затем — более ранние
+    order = np.lexsort((np.arange(len(cluster_ids)), ~has_valid_inn, cluster_ids))
+    keep = np.zeros(len(cluster_ids), dtype=bool)
+    sorted_ids = cluster_ids[order]
+    keep[order[np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]]] = True
+
+    sizes = np.bincount(cluster_ids, minlength=len(cluster_ids))
+    stats = {
+        'rows': len(seed_companies),
+        'removed': int((~keep).sum()),
+        'clusters': int((sizes > 1).sum()),
+        'conflicts': index.stats['conflicts'],
+    }
+    return seed_companies[keep], stats
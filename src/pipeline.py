@@ -0,0 +1,216 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import Metrics
+from records import records_to_frame
+
+logger = logging.getLogger(__name__)
+
+
+def inn_keys(inns: pd.Series) -> np.ndarray:
+    """Кодирует нормализованные ИНН в int64 без потери ведущих нулей (длина хранится в старших разрядах)."""
+    inns = inns.fillna('').astype(str)
+    lengths = inns.str.len().to_numpy(dtype=np.int64)
+    values = pd.to_numeric(inns.mask(inns == '', '0'), errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+    return values + lengths * 10**10
+
+
+class SeenInnSet:
+    """Компактное множество ИНН: несколько отсортированных массивов int64 (~8 байт на ИНН).
+
+    Массивы сливаются по принципу двоичного счётчика, поэтому добавление
+    стоит O(log n) слияний на элемент, а проверка — бинарный поиск в каждом массиве.
+    """
+
+    def __init__(self):
+        self._runs = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self._runs)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Возвращает булеву маску: какие ключи уже есть в множестве."""
+        keys = np.asarray(keys, dtype=np.int64)
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self._runs:
+            idx = np.searchsorted(run, keys).clip(max=len(run) - 1)
+            found |= run[idx] == keys
+        return found
+
+    def add(self, keys: np.ndarray):
+        """Добавляет ключи в множество."""
+        keys = np.unique(np.asarray(keys, dtype=np.int64))
+        keys = keys[~self.contains(keys)]
+        if len(keys) == 0:
+            return
+
+        self._runs.append(keys)
+        while len(self._runs) > 1 and len(self._runs[-1]) >= len(self._runs[-2]):
+            merged = np.union1d(self._runs.pop(), self._runs.pop())
+            self._runs.append(merged)
+
+
+def iter_seed_chunks(seed, chunk_size: int):
+    """Разбивает seed-список на части.
+
+    seed — DataFrame, путь к CSV (inn, name[, rating_ref]), список путей к CSV (файлы читаются
+    по очереди) или итератор строк-словарей (например, генератор парсера рейтинга: части
+    отдаются по мере поступления строк).
+    """
+    if isinstance(seed, pd.DataFrame):
+        for start in range(0, len(seed), chunk_size):
+            yield seed.iloc[start:start + chunk_size]
+        return
+
+    if isinstance(seed, list) and seed and all(isinstance(path, str) for path in seed):
+        for path in seed:
+            yield from iter_seed_chunks(path, chunk_size)
+        return
+
+    if isinstance(seed, str):
+        rating_ref = os.path.basename(seed)
+        for chunk in pd.read_csv(seed, chunksize=chunk_size, dtype=str, keep_default_na=False):
+            if 'rating_ref' not in chunk.columns:
+                chunk['rating_ref'] = rating_ref
+            yield chunk
+        return
+
+    rows = []
+    for row in seed:
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            yield pd.DataFrame(rows)
+            rows = []
+    if rows:
+        yield pd.DataFrame(rows)
+
+
+class CsvChunkWriter:
+    """Дописывает результат в CSV по частям: заголовок и BOM пишутся только один раз."""
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.rows_written = 0
+        self._columns = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            self._columns = list(pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def existing_inns(self):
+        """Итерирует по частям столбец inn уже записанного файла."""
+        if self._columns is None or 'inn' not in self._columns:
+            return
+        for chunk in pd.read_csv(self.path, usecols=['inn'], dtype=str, keep_default_na=False,
+                                 encoding='utf-8-sig', chunksize=100_000):
+            yield chunk['inn']
+
+    def write(self, df: pd.DataFrame):
+        """Дописывает часть результата в конец файла."""
+        if len(df.columns) == 0:
+            return
+
+        if self._columns is None:
+            self._columns = list(df.columns)
+            df.to_csv(self.path, index=False, encoding='utf-8-sig')
+        else:
+            df.reindex(columns=self._columns).to_csv(
+                self.path, mode='a', header=False, index=False, encoding='utf-8'
+            )
+        self.rows_written += len(df)
+
+    def close(self):
+        """Завершает запись (для CSV файл уже закрыт после каждой части)."""
+
+
+class ChunkedPipeline:
+    """Потоковая обработка seed-списка по частям: обогащение → нормализация → фильтрация → дозапись.
+
+    В памяти одновременно находится только одна часть, а дедупликация по ИНН
+    между частями выполняется через компактное множество SeenInnSet.
+    """
+
+    def __init__(self, enricher, processor, writer, chunk_size: int = 1000, metrics=None,
+                 prefilter=None, index=None):
+        self.enricher = enricher
+        self.processor = processor
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self.seen = SeenInnSet()
+        self.metrics = metrics if metrics is not None else Metrics()
+        # Предфильтр по индексу прошлых запусков (PreFilter) и сам индекс (CompanyIndex), который пополняется
+        self.prefilter = prefilter
+        self.index = index
+        self.stats = {'chunks': 0, 'seed_rows': 0, 'skipped_seen': 0, 'skipped_prefilter': 0,
+                      'enriched': 0, 'duplicates': 0, 'written': 0}
+
+    def mark_seen(self, inns: pd.Series):
+        """Помечает ИНН как уже обработанные (например, из существующего файла результатов)."""
+        self.seen.add(inn_keys(inns))
+
+    def run(self, seed_chunks) -> dict:
+        """Обрабатывает все части seed-списка и возвращает статистику."""
+        for seed_chunk in seed_chunks:
+            self.process_seed_chunk(seed_chunk)
+        self.writer.close()
+        return self.stats
+
+    def process_seed_chunk(self, seed_chunk: pd.DataFrame):
+        """Обогащает одну часть seed-списка и передаёт записи дальше по пайплайну."""
+        self.stats['chunks'] += 1
+        self.stats['seed_rows'] += len(seed_chunk)
+
+        # ИНН, уже встречавшиеся в предыдущих частях, всё равно будут отброшены — не тратим на них запросы
+        seed_inns = seed_chunk['inn'].astype(str).str.strip().str.replace(r'\D', '', regex=True).str[:10]
+        already_seen = self.seen.contains(inn_keys(seed_inns))
+        self.stats['skipped_seen'] += int(already_seen.sum())
+        seed_chunk = seed_chunk[~already_seen]
+
+        skipped_prefilter = 0
+        if self.prefilter is not None:
+            with self.metrics.stage('prefilter', rows=len(seed_chunk)):
+                seed_chunk, prefilter_stats = self.prefilter.apply(seed_chunk)
+            skipped_prefilter = prefilter_stats['skipped_rows']
+            self.stats['skipped_prefilter'] += skipped_prefilter
+            self.metrics.incr('prefilter_skipped', prefilter_stats['skipped'])
+
+        logger.info(f"Часть {self.stats['chunks']}: {len(seed_chunk)} компаний "
+                    f"(пропущено уже обработанных: {int(already_seen.sum())}, "
+                    f"заведомо не проходящих фильтр: {skipped_prefilter})")
+        if seed_chunk.empty:
+            return
+
+        self.process_records(self.enricher.enrich(seed_chunk))
+
+    def process_records(self, records):
+        """Нормализует, дедуплицирует, фильтрует и дописывает в результат готовые записи."""
+        if not records:
+            return
+        self.stats['enriched'] += len(records)
+
+        with self.metrics.stage('normalize', rows=len(records)):
+            raw_df = self.enricher.tag_segments(records_to_frame(records))
+            clean_df = self.processor.normalize_data(raw_df)
+        if self.index is not None:
+            self.index.update(clean_df)
+
+        # Дедупликация по ИНН до фильтрации — как drop_duplicates(keep='first') по всему набору
+        keys = inn_keys(clean_df['inn'])
+        is_new = ~self.seen.contains(keys) & ~pd.Series(keys).duplicated().to_numpy()
+        self.stats['duplicates'] += int((~is_new).sum())
+        self.seen.add(keys[is_new])
+        clean_df = clean_df[is_new]
+
+        with self.metrics.stage('filter', rows=len(clean_df)):
+            final_df = self.processor.filter_companies(clean_df)
+        with self.metrics.stage('write', rows=len(final_df)):
+            self.writer.write(final_df)
+        self.stats['written'] += len(final_df)
@@ -0,0 +1,145 @@
+import logging
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from refresh import max_age, normalize_inns
+
+logger = logging.getLogger(__name__)
+
+# Поля, которые проверяет DataProcessor.filter_companies: по ним индекс должен быть свежим
+PREFILTER_FIELDS = ['revenue', 'okved_main']
+# В индекс попадают только реальные ответы API: mock-данные случайны и не говорят ничего о компании
+INDEXED_SOURCES = ('checko_api',)
+INDEX_COLUMNS = ['inn', 'name', 'okved_main', 'revenue', 'segment_tag', 'description', 'fetched_at']
+# Ограничение SQLite на число параметров в одном запросе
+LOOKUP_BATCH = 900
+
+
+class CompanyIndex:
+    """Локальный индекс ИНН → ОКВЭД, выручка, тег и описание по результатам прошлых запусков (SQLite)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Индекс общий для шардов, как и кэш ответов: ждём снятия блокировки записи
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS companies ("
+            "inn TEXT PRIMARY KEY, name TEXT, okved_main TEXT, revenue REAL, "
+            "segment_tag TEXT, description TEXT, fetched_at TEXT NOT NULL)"
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+
+    def update(self, clean_df: pd.DataFrame) -> int:
+        """Сохраняет нормализованные записи (до фильтрации) и возвращает число записей, попавших в индекс.
+
+        Записи без fetched_at пропускаются, а более старые данные не затирают более свежие.
+        """
+        if clean_df.empty or 'source' not in clean_df.columns or 'fetched_at' not in clean_df.columns:
+            return 0
+
+        df = clean_df[clean_df['source'].isin(INDEXED_SOURCES) & clean_df['fetched_at'].notna()]
+        df = df.reindex(columns=INDEX_COLUMNS).drop_duplicates(subset=['inn'], keep='last')
+        df = df[df['inn'].astype(str) != '']
+        if df.empty:
+            return 0
+
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                f"INSERT INTO companies ({', '.join(INDEX_COLUMNS)}) VALUES ({', '.join('?' * len(INDEX_COLUMNS))}) "
+                "ON CONFLICT(inn) DO UPDATE SET "
+                + ', '.join(f"{column} = excluded.{column}" for column in INDEX_COLUMNS[1:])
+                + " WHERE excluded.fetched_at >= companies.fetched_at",
+                rows
+            )
+            self._conn.execute("COMMIT")
+        return len(df)
+
+    def lookup(self, inns) -> pd.DataFrame:
+        """Возвращает записи индекса для переданных (нормализованных) ИНН."""
+        inns = list(dict.fromkeys(str(inn) for inn in inns))
+        rows = []
+        with self._lock:
+            for start in range(0, len(inns), LOOKUP_BATCH):
+                batch = inns[start:start + LOOKUP_BATCH]
+                rows.extend(self._conn.execute(
+                    f"SELECT {', '.join(INDEX_COLUMNS)} FROM companies "
+                    f"WHERE inn IN ({', '.join('?' * len(batch))})",
+                    batch
+                ).fetchall())
+        return pd.DataFrame(rows, columns=INDEX_COLUMNS)
+
+    def close(self):
+        """Закрывает соединение с базой индекса."""
+        with self._lock:
+            self._conn.close()
+
+
+class PreFilter:
+    """Отсеивает ИНН, которые заведомо не пройдут filter_companies, до запроса к API.
+
+    Для ИНН со свежими данными в индексе применяется сам DataProcessor.filter_companies,
+    поэтому критерии (выручка, ОКВЭД, тег, ключевые слова в названии и описании) совпадают
+    с итоговой фильтрацией. ИНН без данных в индексе запрашиваются всегда: их выручка
+    неизвестна, а тег сегмента по умолчанию (BTL) делает релевантной любую компанию.
+    """
+
+    def __init__(self, index: CompanyIndex, processor, fields: list = None, policy: dict = None):
+        self.index = index
+        self.processor = processor
+        self.fields = fields or PREFILTER_FIELDS
+        self.policy = policy
+        self.stats = {'checked': 0, 'known': 0, 'skipped': 0, 'skipped_rows': 0}
+
+    def apply(self, seed_companies: pd.DataFrame, now: pd.Timestamp = None) -> tuple:
+        """Возвращает (seed-список к обогащению, статистика этого вызова).
+
+        skipped — число сэкономленных запросов (уникальные ИНН), skipped_rows — отброшенные строки seed-списка.
+        """
+        stats = {'checked': 0, 'known': 0, 'skipped': 0, 'skipped_rows': 0}
+        if seed_companies.empty:
+            return seed_companies, stats
+
+        now = now or pd.Timestamp.now(tz='UTC')
+        seed_inns = normalize_inns(seed_companies['inn'])
+        known_df = self.index.lookup(seed_inns[seed_inns != ''].unique())
+        stats['checked'] = int(seed_inns.nunique())
+
+        fetched_at = pd.to_datetime(known_df['fetched_at'], utc=True, errors='coerce')
+        known_df = known_df[now - fetched_at <= max_age(self.fields, self.policy)]
+        stats['known'] = len(known_df)
+
+        if not known_df.empty:
+            known_df = known_df.assign(
+                name=known_df['name'].fillna(''),
+                okved_main=known_df['okved_main'].fillna(''),
+                revenue=known_df['revenue'].astype(float).fillna(0.0),
+                segment_tag=known_df['segment_tag'].fillna(''),
+                description=known_df['description'].fillna('')
+            )
+            passing = self.processor.filter_companies(known_df)['inn']
+            hopeless = known_df['inn'][~known_df['inn'].isin(passing)]
+        else:
+            hopeless = known_df['inn']
+
+        is_hopeless = seed_inns.isin(hopeless)
+        stats['skipped'] = len(hopeless)
+        stats['skipped_rows'] = int(is_hopeless.sum())
+        for key, value in stats.items():
+            self.stats[key] += value
+        return seed_companies[~is_hopeless], stats
@@ -0,0 +1,124 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Потокобезопасный ограничитель частоты запросов (token bucket)."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate должен быть положительным")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """Пополняет ведро токенами за прошедшее время."""
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Блокирует поток до появления свободного токена. Возвращает время ожидания в секундах."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def release(self, status: str = 'ok', retry_after: float = None):
+        """Сообщает ограничителю результат запроса. Для фиксированной частоты ничего не делает."""
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """Token bucket с адаптивной частотой и числом одновременных запросов (AIMD).
+
+    Пока ответы успешные, частота и лимит параллельности плавно растут до максимума.
+    На 429/503 оба значения уменьшаются вдвое (не чаще раза в decrease_cooldown секунд),
+    а заголовок Retry-After приостанавливает выдачу токенов на указанное время.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, max_rate: float = None, min_rate: float = 0.2,
+                 max_concurrency: int = 8, min_concurrency: int = 1, initial_concurrency: int = None,
+                 increase_every: int = 10, decrease_cooldown: float = 1.0):
+        super().__init__(rate, burst)
+        self.max_rate = float(max_rate or rate)
+        self.min_rate = min(float(min_rate), self.rate)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        # Начинаем с половины максимума и наращиваем, пока ответы успешные
+        if initial_concurrency is None:
+            initial_concurrency = max(self.min_concurrency, self.max_concurrency // 2)
+        self.concurrency = max(self.min_concurrency, min(int(initial_concurrency), self.max_concurrency))
+        self.increase_every = increase_every
+        self.decrease_cooldown = decrease_cooldown
+
+        self.throttled = 0
+        self.errors = 0
+        self._in_flight = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._slots = threading.Condition(self._lock)
+
+    def acquire(self) -> float:
+        """Ждёт свободный слот параллельности, окончание паузы Retry-After и токен."""
+        started = time.monotonic()
+        with self._slots:
+            while self._in_flight >= self.concurrency:
+                self._slots.wait()
+            self._in_flight += 1
+
+        while True:
+            with self._lock:
+                delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                break
+            time.sleep(delay)
+
+        super().acquire()
+        return time.monotonic() - started
+
+    def release(self, status: str = 'ok', retry_after: float = None):
+        """Сообщает результат запроса: 'ok', 'throttled' (429/503) или 'error' (прочие 5xx и сетевые ошибки)."""
+        with self._slots:
+            self._in_flight = max(0, self._in_flight - 1)
+            now = time.monotonic()
+
+            if status == 'ok':
+                self._successes += 1
+                if self._successes >= self.increase_every:
+                    self._successes = 0
+                    self.rate = min(self.max_rate, self.rate + max(self.rate * 0.1, 0.1))
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            else:
+                self._successes = 0
+                if status == 'throttled':
+                    self.throttled += 1
+                    if now - self._last_decrease >= self.decrease_cooldown:
+                        self._last_decrease = now
+                        self._refill(now)
+                        self.rate = max(self.min_rate, self.rate / 2)
+                        self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+                else:
+                    self.errors += 1
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+
+            self._slots.notify_all()
+
+    def stats(self) -> dict:
+        """Текущие параметры ограничителя и счётчики отказов."""
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'concurrency': self.concurrency,
+                'throttled': self.throttled,
+                'errors': self.errors
+            }
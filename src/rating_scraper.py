@@ -0,0 +1,170 @@
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from name_dedup import is_valid_inn
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+logger = logging.getLogger(__name__)
+
+INN_PATTERN = re.compile(r'(?<!\d)(\d{10}|\d{12})(?!\d)')
+INN_LABEL_PATTERN = re.compile(r'ИНН\D{0,5}(\d{10}|\d{12})(?!\d)', re.IGNORECASE)
+PAGE_PATTERN = re.compile(r'([?&]page=|/page/)(\d+)')
+NAME_CLASS_PATTERN = re.compile(r'name|title|company', re.IGNORECASE)
+
+
+class RatingScraper:
+    """Потоковый парсер постраничных отраслевых рейтингов (вёрстка в стиле sostav.ru).
+
+    Первая страница загружается сразу, по ссылкам пагинации определяется номер последней,
+    остальные страницы загружаются параллельно через общий пул соединений. Строки
+    {name, inn, rating_ref} отдаются генератором по мере разбора страниц.
+    """
+
+    def __init__(self, session: requests.Session = None, max_workers: int = 4, max_pages: int = 100,
+                 timeout: float = 15, parser: str = None, require_inn: bool = True):
+        self.max_workers = max(1, int(max_workers))
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.parser = parser or HTML_PARSER
+        # Строки без ИНН нельзя обогатить через API — по умолчанию пропускаем их
+        self.require_inn = require_inn
+        self.stats = {'pages': 0, 'failed_pages': 0, 'rows': 0, 'skipped_no_inn': 0}
+        self._stats_lock = threading.Lock()
+
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+                'Accept': 'text/html'
+            })
+            # Пул соединений под параллельную загрузку страниц и повторы при временных ошибках
+            retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers,
+                                  max_retries=retry)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+    def iter_companies(self, url: str):
+        """Генератор строк {name, inn, rating_ref} со всех страниц рейтинга.
+
+        Исключение при загрузке первой страницы пробрасывается вызывающему коду,
+        ошибки остальных страниц логируются и учитываются в stats['failed_pages'].
+        """
+        soup = self._fetch_page(url)
+        page_urls = self._page_urls(soup, url)
+
+        # Остальные страницы начинают загружаться, пока потребитель обрабатывает строки первой
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._fetch_and_parse, page_url): page_url for page_url in page_urls}
+            try:
+                yield from self._parse_rows(soup, url)
+
+                for future in as_completed(futures):
+                    try:
+                        rows = future.result()
+                    except (requests.RequestException, ValueError) as e:
+                        self._count('failed_pages')
+                        logger.warning(f"Не удалось загрузить страницу рейтинга {futures[future]}: {e}")
+                        continue
+                    yield from rows
+            finally:
+                # Если потребитель прекратил чтение раньше, не загружаем оставшиеся страницы
+                for future in futures:
+                    future.cancel()
+
+    def _count(self, key: str):
+        """Увеличивает счётчик статистики (страницы разбираются в нескольких потоках)."""
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _fetch_page(self, url: str) -> BeautifulSoup:
+        """Загружает и разбирает одну страницу."""
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        self._count('pages')
+        return BeautifulSoup(response.content, self.parser)
+
+    def _fetch_and_parse(self, url: str) -> list:
+        """Загружает страницу и сразу извлекает строки (выполняется в потоке пула)."""
+        return list(self._parse_rows(self._fetch_page(url), url))
+
+    def _page_urls(self, soup: BeautifulSoup, url: str) -> list:
+        """Адреса страниц 2..N по ссылкам пагинации (номер последней страницы — максимальный в ссылках)."""
+        last_page, template = 1, None
+        for link in soup.find_all('a', href=True):
+            match = PAGE_PATTERN.search(link['href'])
+            if match and int(match.group(2)) > last_page:
+                last_page, template = int(match.group(2)), (link['href'], match)
+
+        if template is None:
+            return []
+        if last_page > self.max_pages:
+            logger.warning(f"В рейтинге {last_page} страниц, загружаем первые {self.max_pages}")
+            last_page = self.max_pages
+
+        href, match = template
+        return [
+            urljoin(url, href[:match.start(2)] + str(page) + href[match.end(2):])
+            for page in range(2, last_page + 1)
+        ]
+
+    def _parse_rows(self, soup: BeautifulSoup, url: str):
+        """Извлекает компании из строк таблицы рейтинга."""
+        for tr in soup.find_all('tr'):
+            cells = tr.find_all('td')
+            if not cells:
+                continue
+
+            name_el = self._find_name_element(tr) or tr.find('a') or cells[min(1, len(cells) - 1)]
+            name = ' '.join(name_el.get_text(' ', strip=True).split())
+            if not name:
+                continue
+
+            inn = self._extract_inn(tr)
+            if not inn and self.require_inn:
+                self._count('skipped_no_inn')
+                continue
+
+            self._count('rows')
+            yield {'name': name, 'inn': inn, 'rating_ref': url}
+
+    @staticmethod
+    def _find_name_element(tr):
+        """Самый вложенный элемент с классом name/title/company.
+
+        Класс вроде «rating-table__company» часто стоит на ячейке, где кроме ссылки
+        с названием есть ИНН и город — берём элемент, внутри которого таких классов нет.
+        """
+        candidates = tr.find_all(class_=NAME_CLASS_PATTERN)
+        return next((el for el in reversed(candidates) if el.find(class_=NAME_CLASS_PATTERN) is None), None)
+
+    @staticmethod
+    def _extract_inn(tr) -> str:
+        """ИНН строки: атрибут data-inn, текст после «ИНН» или отдельное 10/12-значное число.
+
+        Неподписанное число принимается, только если у него верные контрольные разряды:
+        телефоны, выручка в рублях и внутренние идентификаторы тоже бывают 10- и 12-значными.
+        """
+        tagged = tr if tr.has_attr('data-inn') else tr.find(attrs={'data-inn': True})
+        if tagged is not None:
+            return tagged['data-inn'].strip()
+
+        text = tr.get_text(' ', strip=True)
+        match = INN_LABEL_PATTERN.search(text)
+        if match:
+            return match.group(1)
+        return next((number for number in INN_PATTERN.findall(text) if is_valid_inn(number)), '')
@@ -0,0 +1,157 @@
+import math
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# Числовые поля хранятся в типизированных массивах: int64, пока приходят целые, иначе float64 (None → NaN)
+NUMERIC_FIELDS = ('revenue', 'employees', 'revenue_year')
+# Поля с небольшим числом различных значений: одинаковые строки хранятся в одном экземпляре
+REPEATED_FIELDS = ('okved_main', 'region', 'source', 'segment_tag', 'rating_ref', 'fetched_at')
+
+_NUMPY_TYPES = {'d': np.float64, 'q': np.int64}
+
+
+class _NumericColumn:
+    """Столбец чисел в array('q') или array('d') с тем же выводом типа, что у pandas.
+
+    Целые хранятся в int64; первое дробное значение или пропуск переводят столбец в float64.
+    Если значение не число (например, выручка строкой из импортированных данных),
+    столбец становится обычным списком — как object-столбец в pandas.
+    """
+
+    __slots__ = ('values',)
+
+    def __init__(self, size: int = 0):
+        # Столбец, появившийся не в первой записи, начинается с пропусков
+        self.values = array('d', [math.nan]) * size if size else array('q')
+
+    def append(self, value):
+        values = self.values
+        if isinstance(values, array):
+            try:
+                if isinstance(value, bool):
+                    raise TypeError
+                values.append(math.nan if value is None else value)
+                return
+            except TypeError:
+                if values.typecode == 'q' and (value is None or isinstance(value, float)):
+                    self.values = array('d', values)
+                    self.values.append(math.nan if value is None else value)
+                    return
+            except OverflowError:
+                pass
+            # Разберёт normalize_data; NaN возвращаем в None, как было в исходных записях
+            self.values = [None if v != v else v for v in values.tolist()]
+        self.values.append(value)
+
+    def _as_numpy(self) -> np.ndarray:
+        return np.frombuffer(self.values, dtype=_NUMPY_TYPES[self.values.typecode])
+
+    def take(self, order: np.ndarray):
+        if isinstance(self.values, array):
+            self.values = array(self.values.typecode, self._as_numpy()[order].tobytes())
+        else:
+            self.values = [self.values[i] for i in order]
+
+    def to_series(self, name: str) -> pd.Series:
+        if isinstance(self.values, array):
+            return pd.Series(self._as_numpy().copy(), name=name)
+        return pd.Series(self.values, name=name)
+
+
+class _ObjectColumn:
+    """Столбец произвольных значений; строки повторяющихся полей хранятся в одном экземпляре."""
+
+    __slots__ = ('values', '_interned')
+
+    def __init__(self, size: int = 0, interned: bool = False):
+        self.values = [None] * size
+        self._interned = {} if interned else None
+
+    def append(self, value):
+        if self._interned is not None and isinstance(value, str):
+            value = self._interned.setdefault(value, value)
+        self.values.append(value)
+
+    def take(self, order: np.ndarray):
+        self.values = [self.values[i] for i in order]
+
+    def to_series(self, name: str) -> pd.Series:
+        return pd.Series(self.values, name=name, dtype=None if self.values else object)
+
+
+class RecordColumns:
+    """Колоночный накопитель обогащённых записей вместо списка словарей.
+
+    Записи (словари из DataFetcher или журнала) раскладываются по столбцам сразу
+    при добавлении: числа — в типизированные массивы, повторяющиеся строки — в общие
+    экземпляры. DataFrame строится из готовых столбцов без промежуточных словарей.
+    Семантика как у pd.DataFrame(list_of_dicts): новые ключи добавляют столбец,
+    отсутствующие значения заполняются None/NaN.
+    """
+
+    def __init__(self, records=None):
+        self._columns = {}
+        self._size = 0
+        if records is not None:
+            self.extend(records)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        """Итерирует по записям в виде словарей (для журнала и отладки)."""
+        names = list(self._columns)
+        columns = [self._columns[name].to_series(name).tolist() for name in names]
+        for values in zip(*columns):
+            yield dict(zip(names, values))
+
+    @property
+    def columns(self) -> list:
+        return list(self._columns)
+
+    def _add_column(self, name: str):
+        if name in NUMERIC_FIELDS:
+            column = _NumericColumn(self._size)
+        else:
+            column = _ObjectColumn(self._size, interned=name in REPEATED_FIELDS)
+        self._columns[name] = column
+        return column
+
+    def append(self, record: dict, **overrides):
+        """Добавляет запись; overrides заменяют отдельные поля (например, rating_ref) без копии словаря."""
+        for name in record:
+            if name not in self._columns:
+                self._add_column(name)
+        for name in overrides:
+            if name not in self._columns:
+                self._add_column(name)
+
+        for name, column in self._columns.items():
+            column.append(overrides[name] if name in overrides else record.get(name))
+        self._size += 1
+
+    def extend(self, records):
+        """Добавляет записи из итератора словарей (или другого RecordColumns)."""
+        for record in records:
+            self.append(record)
+
+    def reorder(self, order):
+        """Переставляет записи: i-я запись становится order[i]-й из текущих."""
+        order = np.asarray(order, dtype=np.int64)
+        for column in self._columns.values():
+            column.take(order)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Строит DataFrame из накопленных столбцов."""
+        if not self._columns:
+            return pd.DataFrame()
+        return pd.DataFrame({name: column.to_series(name) for name, column in self._columns.items()})
+
+
+def records_to_frame(records) -> pd.DataFrame:
+    """DataFrame из RecordColumns или списка словарей (например, записей журнала)."""
+    if isinstance(records, RecordColumns):
+        return records.to_frame()
+    return pd.DataFrame(records)
@@ -0,0 +1,103 @@
+import argparse
+import logging
+import os
+
+import pandas as pd
+
+from storage import load_dataset, to_plain_dtypes
+
+logger = logging.getLogger(__name__)
+
+# Максимальный возраст данных по полям (в днях): отчётность публикуется раз в год,
+# а контакты и сайт меняются чаще
+FRESHNESS_POLICY = {
+    'revenue': 180,
+    'employees': 90,
+    'okved_main': 90,
+    'region': 90,
+    'contacts': 30,
+    'site': 30,
+}
+# Поля, проверяемые по умолчанию: по ним работает фильтр (выручка и ОКВЭД), контакты и сайт
+# подключаются явно через --refresh-fields
+DEFAULT_REFRESH_FIELDS = ['revenue', 'okved_main']
+
+
+def parse_fields(value: str) -> list:
+    """Разбирает список полей через запятую и проверяет, что для них задана политика свежести."""
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in FRESHNESS_POLICY]
+    if unknown or not fields:
+        raise argparse.ArgumentTypeError(
+            f"неизвестные поля: {', '.join(unknown) or '—'}; доступны: {', '.join(FRESHNESS_POLICY)}"
+        )
+    return fields
+
+
+def max_age(fields: list = None, policy: dict = None) -> pd.Timedelta:
+    """Допустимый возраст записи: самое строгое ограничение среди отслеживаемых полей.
+
+    API отдаёт запись целиком с одним fetched_at, поэтому сроки полей сводятся к минимальному:
+    добавление contacts/site (30 дней) означает ежемесячный перезапрос всех записей.
+    """
+    policy = policy or FRESHNESS_POLICY
+    return pd.Timedelta(days=min(policy[field] for field in (fields or DEFAULT_REFRESH_FIELDS)))
+
+
+def normalize_inns(inns: pd.Series) -> pd.Series:
+    """Приводит ИНН к виду после normalize_data: только цифры, не длиннее 10 символов."""
+    return inns.astype(str).str.strip().str.replace(r'\D', '', regex=True).str[:10]
+
+
+def load_previous(path: str, fmt: str = None) -> pd.DataFrame:
+    """Загружает прежний результат для сравнения (пустой DataFrame, если файла ещё нет)."""
+    if not os.path.exists(path):
+        logger.warning(f"Прежний результат {path} не найден — будут запрошены все компании")
+        return pd.DataFrame()
+    return to_plain_dtypes(load_dataset(path, fmt))
+
+
+def plan_refresh(seed_companies: pd.DataFrame, previous_df: pd.DataFrame, fields: list = None,
+                 policy: dict = None, now: pd.Timestamp = None) -> tuple:
+    """Отбирает из seed-списка ИНН, которые нужно запросить: новые и с устаревшими данными.
+
+    Возвращает (seed-список к обогащению, статистика new / stale / fresh). Записи
+    без fetched_at (файлы до появления этого столбца) считаются устаревшими.
+    """
+    now = now or pd.Timestamp.now(tz='UTC')
+    seed_inns = normalize_inns(seed_companies['inn'])
+
+    if previous_df.empty or 'inn' not in previous_df.columns:
+        is_known = pd.Series(False, index=seed_companies.index)
+        is_stale = is_known
+    else:
+        previous = previous_df.drop_duplicates(subset=['inn'], keep='last').set_index('inn')
+        if 'fetched_at' in previous.columns:
+            fetched_at = pd.to_datetime(previous['fetched_at'], utc=True, errors='coerce')
+        else:
+            fetched_at = pd.Series(pd.NaT, index=previous.index, dtype='datetime64[ns, UTC]')
+
+        is_known = seed_inns.isin(previous.index)
+        seed_fetched_at = seed_inns.map(fetched_at)
+        is_stale = is_known & (seed_fetched_at.isna() | (now - seed_fetched_at > max_age(fields, policy)))
+
+    to_fetch = ~is_known | is_stale
+    stats = {
+        'new': int((~is_known).sum()),
+        'stale': int(is_stale.sum()),
+        'fresh': int((is_known & ~is_stale).sum()),
+    }
+    return seed_companies[to_fetch], stats
+
+
+def merge_refreshed(previous_df: pd.DataFrame, refreshed_df: pd.DataFrame, fetched_inns: pd.Series) -> pd.DataFrame:
+    """Объединяет результат обновления с прежним набором.
+
+    fetched_inns — ИНН, по которым API вернул данные (до фильтрации). Прежние записи
+    по ним удаляются (в том числе если компания больше не проходит фильтр), а прошедшие
+    фильтр новые записи добавляются. ИНН, запрос по которым не удался, сохраняют прежние записи.
+    """
+    if previous_df.empty:
+        return refreshed_df
+    kept_df = previous_df[~previous_df['inn'].isin(normalize_inns(fetched_inns))]
+    return pd.concat([kept_df, refreshed_df], ignore_index=True)
@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Постоянный кэш ответов Checko API по ИНН на базе SQLite."""
+
+    def __init__(self, path: str, ttl_seconds: float = 24 * 3600, max_entries: int = 100_000):
+        self.path = path
+        # ttl_seconds=None — записи не устаревают
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Кэш может быть общим для нескольких процессов (шардов): ждём снятия блокировки записи
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "inn TEXT PRIMARY KEY, payload TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_fetched_at ON responses (fetched_at)")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, inn: str):
+        """Возвращает (payload, время получения в секундах Unix) для ИНН или None, если записи нет или она устарела.
+
+        Время получения нужно, чтобы запись из кэша не выглядела свежее, чем ответ API, на котором она основана.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, fetched_at FROM responses WHERE inn = ?", (str(inn),)
+            ).fetchone()
+
+            if row is None or self._is_expired(row[1]):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def put(self, inn: str, payload: dict, fetched_at: float = None):
+        """Сохраняет payload для ИНН и при переполнении вытесняет самые старые записи."""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        data = json.dumps(payload, ensure_ascii=False)
+
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM responses WHERE inn = ?", (str(inn),)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (inn, payload, fetched_at) VALUES (?, ?, ?)",
+                (str(inn), data, fetched_at)
+            )
+            if not exists:
+                self._size += 1
+            if self.max_entries and self._size > self.max_entries:
+                self._evict(self._size - self.max_entries)
+
+    def _evict(self, count: int):
+        """Удаляет count самых давно полученных записей."""
+        self._conn.execute(
+            "DELETE FROM responses WHERE inn IN "
+            "(SELECT inn FROM responses ORDER BY fetched_at LIMIT ?)",
+            (count,)
+        )
+        self._size -= count
+        self.evictions += count
+
+    def _is_expired(self, fetched_at: float) -> bool:
+        """Проверяет, истёк ли TTL записи."""
+        return self.ttl_seconds is not None and time.time() - fetched_at > self.ttl_seconds
+
+    def stats(self) -> dict:
+        """Возвращает счётчики попаданий и промахов кэша."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'size': self._size
+        }
+
+    def close(self):
+        """Закрывает соединение с базой кэша."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,67 @@
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import load_dataset, to_plain_dtypes
+
+logger = logging.getLogger(__name__)
+
+
+def parse_shard(value: str) -> tuple:
+    """Разбирает номер шарда вида «I/N» (I от 1 до N) в пару (индекс с нуля, число шардов)."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается номер шарда вида I/N, получено «{value}»")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"номер шарда должен быть от 1 до {count}")
+    return index - 1, count
+
+
+def shard_ids(inns: pd.Series, num_shards: int) -> np.ndarray:
+    """Номер шарда для каждого ИНН: стабильный хэш нормализованного ИНН по модулю числа шардов.
+
+    Хэш не зависит от процесса и машины, поэтому узлы, читающие общий seed-файл,
+    делят его одинаково, а один и тот же ИНН всегда попадает в один шард.
+    """
+    normalized = inns.astype(str).str.strip().str.replace(r'\D', '', regex=True).str[:10]
+    hashes = pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+    return (hashes % np.uint64(num_shards)).astype(np.int64)
+
+
+def select_shard(seed_companies: pd.DataFrame, shard: int, num_shards: int) -> pd.DataFrame:
+    """Оставляет строки seed-списка, относящиеся к шарду shard (индекс с нуля)."""
+    if num_shards <= 1:
+        return seed_companies
+    return seed_companies[shard_ids(seed_companies['inn'], num_shards) == shard]
+
+
+def shard_path(path: str, shard: int, num_shards: int) -> str:
+    """Путь к файлу шарда: companies.parquet → companies.shard-02-of-04.parquet."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard + 1:02d}-of-{num_shards:02d}{ext}"
+
+
+def merge_shards(paths: list, processor, fmt: str = None) -> pd.DataFrame:
+    """Объединяет нормализованные результаты шардов: глобальная дедупликация по ИНН и фильтрация."""
+    frames = []
+    for path in paths:
+        if not os.path.exists(path):
+            logger.warning(f"Файл шарда не найден: {path}")
+            continue
+        try:
+            # Словари категорий у шардов разные — для объединения возвращаем строки
+            df = to_plain_dtypes(load_dataset(path, fmt))
+        except pd.errors.EmptyDataError:
+            continue
+        frames.append(df)
+        logger.info(f"Шард {path}: {len(df)} записей")
+
+    if not frames:
+        return pd.DataFrame()
+
+    merged_df = pd.concat(frames, ignore_index=True).drop_duplicates(subset=['inn'], keep='first')
+    return processor.filter_companies(merged_df)
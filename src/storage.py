@@ -0,0 +1,228 @@
+import logging
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = feather = pq = None
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'feather')
+
+# Столбцы с небольшим числом различных значений хранятся как категории
+CATEGORY_COLUMNS = ['region', 'okved_main', 'segment_tag']
+FLOAT_COLUMNS = ['revenue', 'employees']
+# Служебные столбцы, которые не считаются изменением записи при --upsert
+VOLATILE_COLUMNS = ['fetched_at']
+
+
+def _require_pyarrow():
+    """Проверяет, что установлен pyarrow (нужен для Parquet и Feather)."""
+    if pa is None:
+        raise ImportError("Для форматов Parquet/Feather установите pyarrow: pip install pyarrow")
+
+
+def detect_format(path: str, fmt: str = None) -> str:
+    """Определяет формат файла по явному значению или по расширению."""
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    return {'parquet': 'parquet', 'pq': 'parquet', 'feather': 'feather', 'arrow': 'feather'}.get(ext, 'csv')
+
+
+def apply_columnar_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Приводит столбцы результата к компактным типам: inn — int64, выручка — float, категории."""
+    df = df.copy()
+
+    if 'inn' in df.columns:
+        inn = pd.to_numeric(df['inn'].astype(str).str.strip(), errors='coerce')
+        df['inn'] = inn.astype('int64') if inn.notna().all() else inn.astype('Int64')
+
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+
+    if 'revenue_year' in df.columns:
+        df['revenue_year'] = pd.to_numeric(df['revenue_year'], errors='coerce').astype('Int64')
+
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(str).astype('category')
+
+    return df
+
+
+def restore_inn(df: pd.DataFrame) -> pd.DataFrame:
+    """Возвращает ИНН к строковому виду (10 цифр с ведущими нулями) после чтения из колоночного формата."""
+    if 'inn' in df.columns and pd.api.types.is_numeric_dtype(df['inn']):
+        df = df.copy()
+        inn = df['inn'].astype('Int64').astype(str).str.zfill(10)
+        df['inn'] = inn.mask(df['inn'].isna(), '')
+    return df
+
+
+def to_plain_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Обратное к apply_columnar_dtypes: ИНН и категории — строками, как после normalize_data."""
+    df = restore_inn(df)
+    return df.astype({col: str for col in CATEGORY_COLUMNS if col in df.columns})
+
+
+def save_dataset(df: pd.DataFrame, path: str, fmt: str = None):
+    """Сохраняет результат в CSV, Parquet или Feather."""
+    fmt = detect_format(path, fmt)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if fmt == 'csv':
+        restore_inn(df).to_csv(path, index=False, encoding='utf-8-sig')
+        return
+
+    _require_pyarrow()
+    table = pa.Table.from_pandas(apply_columnar_dtypes(df), preserve_index=False)
+    if fmt == 'parquet':
+        pq.write_table(table, path, compression='zstd')
+    else:
+        feather.write_feather(table, path, compression='zstd')
+
+
+def load_dataset(path: str, fmt: str = None, columns: list = None) -> pd.DataFrame:
+    """Загружает ранее сохранённый результат с колоночными типами."""
+    fmt = detect_format(path, fmt)
+
+    if fmt == 'csv':
+        header = pd.read_csv(path, nrows=0, encoding='utf-8-sig', usecols=columns).columns
+        dtypes = {col: str for col in header if col not in FLOAT_COLUMNS}
+        df = pd.read_csv(path, dtype=dtypes, keep_default_na=False, na_values={col: [''] for col in FLOAT_COLUMNS},
+                         encoding='utf-8-sig', usecols=columns, float_precision='round_trip')
+        return apply_columnar_dtypes(df)
+
+    _require_pyarrow()
+    if fmt == 'parquet':
+        table = pq.read_table(path, columns=columns)
+    else:
+        table = feather.read_table(path, columns=columns)
+    return apply_columnar_dtypes(table.to_pandas())
+
+
+def _row_hashes(df: pd.DataFrame, columns: list) -> pd.Series:
+    """Хэш содержимого строки по заданным столбцам (для поиска изменившихся записей)."""
+    return pd.util.hash_pandas_object(df[columns].astype(str), index=False)
+
+
+def upsert_dataset(df: pd.DataFrame, path: str, fmt: str = None) -> dict:
+    """Объединяет новый результат с сохранённым по ИНН: новые записи добавляются, изменившиеся заменяются.
+
+    Файл перезаписывается только если что-то изменилось. Возвращает счётчики
+    inserted / updated / unchanged / total.
+    """
+    fmt = detect_format(path, fmt)
+    new_df = apply_columnar_dtypes(df.drop_duplicates(subset=['inn'], keep='first'))
+
+    if not os.path.exists(path):
+        save_dataset(new_df, path, fmt)
+        return {'inserted': len(new_df), 'updated': 0, 'unchanged': 0, 'total': len(new_df)}
+
+    existing_df = load_dataset(path, fmt)
+    common_columns = [c for c in new_df.columns if c in existing_df.columns and c not in VOLATILE_COLUMNS]
+    existing_hashes = pd.Series(_row_hashes(existing_df, common_columns).to_numpy(), index=existing_df['inn'])
+    existing_hashes = existing_hashes[~existing_hashes.index.duplicated(keep='last')]
+
+    is_insert = ~new_df['inn'].isin(existing_hashes.index).to_numpy()
+    is_update = ~is_insert
+    new_hashes = _row_hashes(new_df[is_update], common_columns).to_numpy()
+    is_update[is_update] = existing_hashes.loc[new_df['inn'][is_update]].to_numpy() != new_hashes
+
+    stats = {
+        'inserted': int(is_insert.sum()),
+        'updated': int(is_update.sum()),
+        'unchanged': int((~is_insert & ~is_update).sum()),
+    }
+
+    changed_df = new_df[is_insert | is_update]
+    if changed_df.empty:
+        stats['total'] = len(existing_df)
+        logger.info(f"Изменений нет, файл {path} не перезаписывается")
+        return stats
+
+    kept_df = existing_df[~existing_df['inn'].isin(changed_df['inn'])]
+    merged_df = pd.concat([kept_df, changed_df], ignore_index=True)
+    stats['total'] = len(merged_df)
+
+    save_dataset(merged_df, path, fmt)
+    return stats
+
+
+class ParquetChunkWriter:
+    """Дописывает результат в Parquet по частям (одна row group на часть) с единой схемой."""
+
+    def __init__(self, path: str, append: bool = False):
+        _require_pyarrow()
+        self.path = path
+        self.rows_written = 0
+        self._tmp_path = path + '.tmp'
+        self._writer = None
+        self._schema = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Parquet нельзя дописать на месте: при продолжении переносим уже записанные части в новый файл
+        self._previous = path if append and os.path.exists(path) else None
+
+    def existing_inns(self):
+        """Итерирует по частям столбец inn уже записанного файла."""
+        if self._previous is None:
+            return
+        for batch in pq.ParquetFile(self._previous).iter_batches(columns=['inn'], batch_size=100_000):
+            yield restore_inn(batch.to_pandas())['inn']
+
+    def _to_table(self, df: pd.DataFrame):
+        """Конвертирует часть в таблицу Arrow с единой для всего файла схемой."""
+        df = apply_columnar_dtypes(df)
+        # Словари категорий различаются между частями, поэтому в файл пишем строки
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype(str)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        return table if self._schema is None else table.select(self._schema.names).cast(self._schema)
+
+    def _open(self, schema):
+        """Открывает новый файл и переносит в него части из предыдущего запуска."""
+        self._schema = schema
+        self._writer = pq.ParquetWriter(self._tmp_path, schema, compression='zstd')
+        if self._previous is not None:
+            for batch in pq.ParquetFile(self._previous).iter_batches():
+                self._writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+
+    def write(self, df: pd.DataFrame):
+        """Дописывает часть результата."""
+        if len(df.columns) == 0:
+            return
+
+        if self._writer is None:
+            if self._previous is not None:
+                self._open(pq.read_schema(self._previous))
+                table = self._to_table(df)
+            else:
+                table = self._to_table(df)
+                self._open(table.schema)
+        else:
+            table = self._to_table(df)
+
+        self._writer.write_table(table)
+        self.rows_written += len(df)
+
+    def close(self):
+        """Закрывает файл и атомарно заменяет им файл результатов."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        os.replace(self._tmp_path, self.path)